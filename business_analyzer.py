@@ -5,18 +5,111 @@ CRITICAL: LLM for reasoning ONLY, not for numbers
 """
 
 from typing import Dict, List, Optional
+import asyncio
 import logging
 from pathlib import Path
 
+from src.shared.singletons import cached_query_embeddings, run_sync
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Prompt templates are built once at import; only the context is filled in per call
+BUSINESS_PROMPT = """Based on the following excerpts from an IPO prospectus, analyze the company's business model.
+
+Context:
+{context}
+
+Provide a structured analysis covering:
+1. Core Business Model (how the company makes money)
+2. Key Products/Services
+3. Value Proposition
+4. Revenue Streams
+
+CRITICAL: Base your analysis ONLY on the provided context. Do not make up information.
+If certain details are not available, state that clearly.
+
+Analysis:"""
+
+BUSINESS_SYSTEM_PROMPT = """You are a business analyst specializing in IPO prospectus analysis.
+Your role is to extract and synthesize information about business models.
+NEVER invent facts or numbers. Only use information from the provided context."""
+
+MARKET_PROMPT = """Analyze the company's market position based on this prospectus information:
+
+{context}
+
+Cover:
+1. Market Position & Share
+2. Competitive Landscape
+3. Key Competitors (if mentioned)
+4. Competitive Advantages
+5. Market Trends
+
+Only use information from the context. State if information is unavailable.
+
+Analysis:"""
+
+OPERATIONS_PROMPT = """Analyze operational aspects from this prospectus:
+
+{context}
+
+Focus on:
+1. Manufacturing/Operations Capacity
+2. Capacity Utilization
+3. Supply Chain Dependencies
+4. Key Operational Risks
+5. Expansion Plans
+
+Base analysis strictly on provided context.
+
+Analysis:"""
+
+CUSTOMER_PROMPT = """Analyze the customer base from prospectus:
+
+{context}
+
+Address:
+1. Major Customers (if disclosed)
+2. Customer Concentration Risk
+3. Geographic Distribution
+4. Customer Dependencies
+
+Extract only what is stated in the context.
+
+Analysis:"""
+
+
 class BusinessAnalyzer:
     """
     Analyze business aspects using RAG with LLM
     """
     
+    BUSINESS_MODEL_QUERIES = (
+        "What is the company's business model and how does it generate revenue?",
+        "What products or services does the company offer?",
+        "What is the company's value proposition?",
+    )
+    
+    MARKET_POSITION_QUERIES = (
+        "What is the company's market position and market share?",
+        "Who are the main competitors?",
+        "What are the competitive advantages?",
+    )
+    
+    OPERATIONS_QUERIES = (
+        "What is the manufacturing capacity and utilization?",
+        "What is the supply chain structure?",
+        "What are the operational dependencies?",
+    )
+    
+    CUSTOMER_QUERIES = (
+        "Who are the major customers?",
+        "What is the customer concentration?",
+        "Is there customer dependency risk?",
+    )
+    
     def __init__(self, vector_store, embedder, llm_client):
         """
         Initialize analyzer
@@ -30,7 +123,8 @@ class BusinessAnalyzer:
         self.embedder = embedder
         self.llm = llm_client
     
-    def analyze_business_model(self, top_k: int = 10) -> Dict:
+    async def analyze_business_model_async(self, top_k: int = 10,
+                                           query_embs=None) -> Dict:
         """
         Analyze business model from prospectus
         
@@ -39,34 +133,16 @@ class BusinessAnalyzer:
         """
         logger.info("Analyzing business model...")
         
-        queries = [
-            "What is the company's business model and how does it generate revenue?",
-            "What products or services does the company offer?",
-            "What is the company's value proposition?"
-        ]
-        
         # Retrieve relevant chunks
-        all_chunks = []
-        for query in queries:
-            query_emb = self.embedder.embed_single(query)
-            chunks = self.vector_store.search_by_section(
-                query_emb, 
-                section_type='business',
-                top_k=top_k
-            )
-            all_chunks.extend(chunks)
+        if query_embs is None:
+            query_embs = cached_query_embeddings(self.embedder, self.BUSINESS_MODEL_QUERIES)
+        all_chunks = await self._retrieve_chunks(query_embs, top_k, 'business')
         
         # Remove duplicates
-        seen_ids = set()
-        unique_chunks = []
-        for chunk in all_chunks:
-            chunk_id = chunk.get('global_chunk_id')
-            if chunk_id not in seen_ids:
-                seen_ids.add(chunk_id)
-                unique_chunks.append(chunk)
+        unique_chunks = self._deduplicate_chunks(all_chunks, limit=15)
         
         # Analyze with LLM
-        analysis = self._generate_business_analysis(unique_chunks[:15])
+        analysis = await self._generate_business_analysis(unique_chunks)
         
         return {
             'business_model': analysis,
@@ -74,167 +150,209 @@ class BusinessAnalyzer:
             'confidence': 'high' if len(unique_chunks) >= 5 else 'medium'
         }
     
-    def analyze_market_position(self, top_k: int = 10) -> Dict:
+    async def analyze_market_position_async(self, top_k: int = 10,
+                                            query_embs=None) -> Dict:
         """
         Analyze market position and competitive landscape
         """
         logger.info("Analyzing market position...")
         
-        queries = [
-            "What is the company's market position and market share?",
-            "Who are the main competitors?",
-            "What are the competitive advantages?"
-        ]
-        
-        all_chunks = []
-        for query in queries:
-            query_emb = self.embedder.embed_single(query)
-            chunks = self.vector_store.search_by_section(
-                query_emb,
-                section_type='business',
-                top_k=top_k
-            )
-            all_chunks.extend(chunks)
+        if query_embs is None:
+            query_embs = cached_query_embeddings(self.embedder, self.MARKET_POSITION_QUERIES)
+        all_chunks = await self._retrieve_chunks(query_embs, top_k, 'business')
         
         # Deduplicate
-        unique_chunks = self._deduplicate_chunks(all_chunks)
+        unique_chunks = self._deduplicate_chunks(all_chunks, limit=15)
         
-        analysis = self._generate_market_analysis(unique_chunks[:15])
+        analysis = await self._generate_market_analysis(unique_chunks)
         
         return {
             'market_position': analysis,
             'num_sources': len(unique_chunks)
         }
     
-    def analyze_operations(self, top_k: int = 10) -> Dict:
+    async def analyze_operations_async(self, top_k: int = 10,
+                                       query_embs=None) -> Dict:
         """
         Analyze operational aspects
         """
         logger.info("Analyzing operations...")
         
-        queries = [
-            "What is the manufacturing capacity and utilization?",
-            "What is the supply chain structure?",
-            "What are the operational dependencies?"
-        ]
-        
-        all_chunks = []
-        for query in queries:
-            query_emb = self.embedder.embed_single(query)
-            chunks = self.vector_store.search_by_section(
-                query_emb,
-                section_type='business',
-                top_k=top_k
-            )
-            all_chunks.extend(chunks)
+        if query_embs is None:
+            query_embs = cached_query_embeddings(self.embedder, self.OPERATIONS_QUERIES)
+        all_chunks = await self._retrieve_chunks(query_embs, top_k, 'business')
         
-        unique_chunks = self._deduplicate_chunks(all_chunks)
+        unique_chunks = self._deduplicate_chunks(all_chunks, limit=15)
         
-        analysis = self._generate_operations_analysis(unique_chunks[:15])
+        analysis = await self._generate_operations_analysis(unique_chunks)
         
         return {
             'operations': analysis,
             'num_sources': len(unique_chunks)
         }
     
-    def analyze_customers(self, top_k: int = 10) -> Dict:
+    async def analyze_customers_async(self, top_k: int = 10,
+                                      query_embs=None) -> Dict:
         """
         Analyze customer base and concentration
         """
         logger.info("Analyzing customer base...")
         
-        queries = [
-            "Who are the major customers?",
-            "What is the customer concentration?",
-            "Is there customer dependency risk?"
-        ]
+        if query_embs is None:
+            query_embs = cached_query_embeddings(self.embedder, self.CUSTOMER_QUERIES)
+        all_chunks = await self._retrieve_chunks(query_embs, top_k)
         
-        all_chunks = []
-        for query in queries:
-            query_emb = self.embedder.embed_single(query)
-            chunks = self.vector_store.search(query_emb, top_k=top_k)
-            all_chunks.extend(chunks)
+        unique_chunks = self._deduplicate_chunks(all_chunks, limit=10)
         
-        unique_chunks = self._deduplicate_chunks(all_chunks)
-        
-        analysis = self._generate_customer_analysis(unique_chunks[:10])
+        analysis = await self._generate_customer_analysis(unique_chunks)
         
         return {
             'customers': analysis,
             'num_sources': len(unique_chunks)
         }
     
+    def analyze_business_model(self, top_k: int = 10) -> Dict:
+        """
+        Analyze business model from prospectus (blocking wrapper)
+        """
+        return run_sync(self.analyze_business_model_async(top_k))
+    
+    def analyze_market_position(self, top_k: int = 10) -> Dict:
+        """
+        Analyze market position (blocking wrapper)
+        """
+        return run_sync(self.analyze_market_position_async(top_k))
+    
+    def analyze_operations(self, top_k: int = 10) -> Dict:
+        """
+        Analyze operations (blocking wrapper)
+        """
+        return run_sync(self.analyze_operations_async(top_k))
+    
+    def analyze_customers(self, top_k: int = 10) -> Dict:
+        """
+        Analyze customer base (blocking wrapper)
+        """
+        return run_sync(self.analyze_customers_async(top_k))
+    
     def comprehensive_business_analysis(self) -> Dict:
         """
         Run complete business analysis
+        
+        The four analyses are independent, so their LLM calls are issued
+        concurrently. Start Ollama with OLLAMA_NUM_PARALLEL=4 so the server
+        actually serves them in parallel instead of queueing them.
         """
         logger.info("Running comprehensive business analysis...")
         
+        business_model, market_position, operations, customers = run_sync(
+            self._gather_analyses()
+        )
+        
         return {
-            'business_model': self.analyze_business_model(),
-            'market_position': self.analyze_market_position(),
-            'operations': self.analyze_operations(),
-            'customers': self.analyze_customers(),
+            'business_model': business_model,
+            'market_position': market_position,
+            'operations': operations,
+            'customers': customers,
             'summary': self._generate_executive_summary()
         }
     
-    def _generate_business_analysis(self, chunks: List[Dict]) -> str:
+    async def _gather_analyses(self) -> List[Dict]:
+        """
+        Run the four business analyses concurrently
+        """
+        query_sets = (
+            self.BUSINESS_MODEL_QUERIES,
+            self.MARKET_POSITION_QUERIES,
+            self.OPERATIONS_QUERIES,
+            self.CUSTOMER_QUERIES
+        )
+        
+        # Embed all queries in a single batch, then split per analysis
+        all_embs = cached_query_embeddings(self.embedder, sum(query_sets, ()))
+        split_embs = []
+        start = 0
+        for queries in query_sets:
+            split_embs.append(all_embs[start:start + len(queries)])
+            start += len(queries)
+        
+        return await asyncio.gather(
+            self.analyze_business_model_async(query_embs=split_embs[0]),
+            self.analyze_market_position_async(query_embs=split_embs[1]),
+            self.analyze_operations_async(query_embs=split_embs[2]),
+            self.analyze_customers_async(query_embs=split_embs[3])
+        )
+    
+    async def _retrieve_chunks(self, query_embs, top_k: int,
+                               section_type: Optional[str] = None) -> List[Dict]:
+        """
+        Run one vector search per query embedding concurrently
+        
+        FAISS releases the GIL while searching, so the searches overlap
+        on worker threads. Results are concatenated in query order.
+        """
+        if section_type:
+            searches = [
+                asyncio.to_thread(
+                    self.vector_store.search_by_section,
+                    query_emb,
+                    section_type=section_type,
+                    top_k=top_k
+                )
+                for query_emb in query_embs
+            ]
+        else:
+            searches = [
+                asyncio.to_thread(self.vector_store.search, query_emb, top_k=top_k)
+                for query_emb in query_embs
+            ]
+        
+        results = await asyncio.gather(*searches)
+        return [chunk for chunks in results for chunk in chunks]
+    
+    async def _agenerate(self, prompt: str, system_prompt: Optional[str] = None,
+                         temperature: float = 0.1,
+                         max_tokens: Optional[int] = None) -> str:
+        """
+        Non-blocking LLM call
+        
+        Runs the blocking client call in a worker thread so several
+        prompts can be in flight against the Ollama server at once.
+        """
+        kwargs = {'prompt': prompt, 'temperature': temperature}
+        if system_prompt is not None:
+            kwargs['system_prompt'] = system_prompt
+        if max_tokens is not None:
+            kwargs['max_tokens'] = max_tokens
+        
+        return await asyncio.to_thread(self.llm.generate, **kwargs)
+    
+    async def _generate_business_analysis(self, chunks: List[Dict]) -> str:
         """
         Generate business model analysis using LLM
         """
         context = self._build_context(chunks)
         
-        prompt = f"""Based on the following excerpts from an IPO prospectus, analyze the company's business model.
-
-Context:
-{context}
-
-Provide a structured analysis covering:
-1. Core Business Model (how the company makes money)
-2. Key Products/Services
-3. Value Proposition
-4. Revenue Streams
-
-CRITICAL: Base your analysis ONLY on the provided context. Do not make up information.
-If certain details are not available, state that clearly.
-
-Analysis:"""
+        prompt = BUSINESS_PROMPT.format(context=context)
         
-        system_prompt = """You are a business analyst specializing in IPO prospectus analysis.
-Your role is to extract and synthesize information about business models.
-NEVER invent facts or numbers. Only use information from the provided context."""
-        
-        response = self.llm.generate(
+        response = await self._agenerate(
             prompt=prompt,
-            system_prompt=system_prompt,
+            system_prompt=BUSINESS_SYSTEM_PROMPT,
             temperature=0.1,
             max_tokens=1024
         )
         
         return response.strip()
     
-    def _generate_market_analysis(self, chunks: List[Dict]) -> str:
+    async def _generate_market_analysis(self, chunks: List[Dict]) -> str:
         """
         Generate market position analysis
         """
         context = self._build_context(chunks)
         
-        prompt = f"""Analyze the company's market position based on this prospectus information:
-
-{context}
-
-Cover:
-1. Market Position & Share
-2. Competitive Landscape
-3. Key Competitors (if mentioned)
-4. Competitive Advantages
-5. Market Trends
-
-Only use information from the context. State if information is unavailable.
-
-Analysis:"""
+        prompt = MARKET_PROMPT.format(context=context)
         
-        response = self.llm.generate(
+        response = await self._agenerate(
             prompt=prompt,
             system_prompt="You are a market analyst. Extract facts from context only.",
             temperature=0.1
@@ -242,55 +360,30 @@ Analysis:"""
         
         return response.strip()
     
-    def _generate_operations_analysis(self, chunks: List[Dict]) -> str:
+    async def _generate_operations_analysis(self, chunks: List[Dict]) -> str:
         """
         Generate operations analysis
         """
         context = self._build_context(chunks)
         
-        prompt = f"""Analyze operational aspects from this prospectus:
-
-{context}
-
-Focus on:
-1. Manufacturing/Operations Capacity
-2. Capacity Utilization
-3. Supply Chain Dependencies
-4. Key Operational Risks
-5. Expansion Plans
-
-Base analysis strictly on provided context.
-
-Analysis:"""
+        prompt = OPERATIONS_PROMPT.format(context=context)
         
-        response = self.llm.generate(
+        response = await self._agenerate(
             prompt=prompt,
             temperature=0.1
         )
         
         return response.strip()
     
-    def _generate_customer_analysis(self, chunks: List[Dict]) -> str:
+    async def _generate_customer_analysis(self, chunks: List[Dict]) -> str:
         """
         Generate customer base analysis
         """
         context = self._build_context(chunks)
         
-        prompt = f"""Analyze the customer base from prospectus:
-
-{context}
-
-Address:
-1. Major Customers (if disclosed)
-2. Customer Concentration Risk
-3. Geographic Distribution
-4. Customer Dependencies
-
-Extract only what is stated in the context.
-
-Analysis:"""
+        prompt = CUSTOMER_PROMPT.format(context=context)
         
-        response = self.llm.generate(prompt=prompt, temperature=0.1)
+        response = await self._agenerate(prompt=prompt, temperature=0.1)
         return response.strip()
     
     def _generate_executive_summary(self) -> str:
@@ -304,27 +397,26 @@ Analysis:"""
         """
         Build context from chunks
         """
-        context_parts = []
-        for i, chunk in enumerate(chunks, 1):
-            text = chunk['text']
-            context_parts.append(f"[Excerpt {i}]\n{text}")
-        
-        return "\n\n".join(context_parts)
+        return "\n\n".join(
+            f"[Excerpt {i}]\n{chunk['text']}" for i, chunk in enumerate(chunks, 1)
+        )
     
-    def _deduplicate_chunks(self, chunks: List[Dict]) -> List[Dict]:
-        """
-        Remove duplicate chunks
+    def _deduplicate_chunks(self, chunks: List[Dict],
+                            limit: Optional[int] = None) -> List[Dict]:
         """
-        seen_ids = set()
-        unique = []
+        Remove duplicate chunks, keeping the first occurrence of each id
         
+        Args:
+            chunks: Retrieved chunks, possibly overlapping across queries
+            limit: Stop once this many unique chunks are collected
+        """
+        unique = {}
         for chunk in chunks:
-            chunk_id = chunk.get('global_chunk_id')
-            if chunk_id not in seen_ids:
-                seen_ids.add(chunk_id)
-                unique.append(chunk)
+            unique.setdefault(chunk.get('global_chunk_id'), chunk)
+            if limit is not None and len(unique) >= limit:
+                break
         
-        return unique
+        return list(unique.values())
 
 
 def main():
@@ -0,0 +1,100 @@
+"""
+Embedding Cache
+Persistent SQLite cache of chunk embeddings, keyed by text and model
+"""
+
+import hashlib
+import sqlite3
+from typing import List, Optional, Sequence
+import logging
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed store mapping hash(model + text) -> FP32 vector
+    
+    Prospectuses share a lot of boilerplate (disclaimers, legal language),
+    so chunks seen in an earlier IPO skip the embedding model entirely.
+    """
+    
+    # SQLite limits the number of bound parameters per statement
+    MAX_VARS = 500
+    
+    def __init__(self, db_path: Path = Path("data/embeddings/cache.sqlite"),
+                 model_name: str = "", dim: Optional[int] = None):
+        """
+        Open (or create) the cache
+        
+        Args:
+            db_path: SQLite database file
+            model_name: Embedding model name, part of every key
+            dim: Expected embedding dimension; stored vectors of any other
+                dimension are treated as misses
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.dim = dim
+        
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(hash TEXT PRIMARY KEY, model TEXT, dim INTEGER, vec BLOB)"
+        )
+    
+    def _hash(self, text: str) -> str:
+        """
+        Cache key for a chunk text under the current model
+        """
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode()).hexdigest()
+    
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up embeddings for many texts
+        
+        Returns:
+            List aligned with texts; None where the text is not cached
+        """
+        hashes = [self._hash(t) for t in texts]
+        found = {}
+        
+        for start in range(0, len(hashes), self.MAX_VARS):
+            batch = hashes[start:start + self.MAX_VARS]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.conn.execute(
+                f"SELECT hash, dim, vec FROM embeddings WHERE hash IN ({placeholders})",
+                batch
+            )
+            for h, dim, blob in rows:
+                vec = np.frombuffer(blob, dtype=np.float32)
+                if self.dim is not None and (dim != self.dim or vec.size != self.dim):
+                    continue
+                found[h] = vec.copy()
+        
+        return [found.get(h) for h in hashes]
+    
+    def put_many(self, texts: Sequence[str], vectors: Sequence[np.ndarray]):
+        """
+        Store embeddings, replacing existing entries for the same texts
+        """
+        rows = []
+        for text, vec in zip(texts, vectors):
+            vec = np.asarray(vec, dtype=np.float32)
+            rows.append((self._hash(text), self.model_name, vec.shape[-1], vec.tobytes()))
+        
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, model, dim, vec) VALUES (?, ?, ?, ?)",
+                rows
+            )
+    
+    def close(self):
+        """
+        Close the database connection
+        """
+        self.conn.close()
@@ -3,20 +3,73 @@ Analysis Orchestrator
 Coordinates all analysis modules to generate complete IPO analysis
 """
 
+import hashlib
+import importlib
 import json
+import pickle
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Optional
 from pathlib import Path
 import logging
 
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to stdlib json
+    orjson = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+IPO_DETAILS_PROMPT = """Extract IPO details from this prospectus text:
+
+{context}
+
+Provide:
+1. Total issue size
+2. Fresh issue amount
+3. Offer for sale amount
+4. Use of proceeds (breakdown)
+5. Price band (if mentioned)
+
+Format clearly. State if information not available.
+
+IPO Details:"""
+
+# Modules imported lazily by the pipeline steps
+PIPELINE_MODULES = (
+    'src.processing.pdf_parser',
+    'src.processing.table_extractor',
+    'src.embeddings.chunker',
+    'src.analysis.business_analyzer',
+    'src.analysis.financial_calculator',
+    'src.analysis.risk_analyzer',
+    'src.recommendation.scorer',
+)
+
+
+def _prefetch_modules(module_names):
+    """
+    Import modules so later lazy imports hit sys.modules
+    """
+    for name in module_names:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.debug(f"Prefetch of {name} failed: {e}")
+
+
 class IPOAnalysisOrchestrator:
     """
     Orchestrates complete IPO analysis pipeline
     """
     
+    # Chunk key under which Embedder.embed_chunks stores each vector;
+    # cached vectors are written back under it
+    EMBEDDING_KEY = 'embedding'
+    
     def __init__(self, company_name: str, output_dir: Path):
         self.company_name = company_name
         self.output_dir = Path(output_dir)
@@ -28,6 +81,9 @@ class IPOAnalysisOrchestrator:
         self.llm = None
         self.pdf_parser = None
         
+        # Content-based identity of the loaded prospectus, None if unknown
+        self.document_id = None
+        
         # Analysis results
         self.results = {}
     
@@ -37,14 +93,21 @@ class IPOAnalysisOrchestrator:
         """
         logger.info("Initializing analysis components...")
         
+        # Warm the pipeline imports on a background thread so their cost
+        # overlaps model loading instead of landing on the critical path
+        executor = ThreadPoolExecutor(max_workers=1)
+        executor.submit(_prefetch_modules, PIPELINE_MODULES)
+        executor.shutdown(wait=False)
+        
         try:
-            from src.embeddings.embedder import Embedder
             from src.embeddings.vector_store import VectorStore
-            from src.llm.ollama_client import OllamaClient
+            from src.shared.singletons import get_embedder, get_llm
             
-            self.embedder = Embedder()
+            # Model-backed components are shared across analyses; the
+            # vector store holds this prospectus's chunks, so it is not
+            self.embedder = get_embedder()
             self.vector_store = VectorStore()
-            self.llm = OllamaClient()
+            self.llm = get_llm()
             
             logger.info("Components initialized successfully")
             return True
@@ -65,34 +128,40 @@ class IPOAnalysisOrchestrator:
         """
         logger.info(f"Starting complete analysis for {self.company_name}")
         
-        # Step 1: Process PDF
-        logger.info("Step 1/7: Processing PDF...")
-        processed_data = self.process_pdf(pdf_path)
-        if not processed_data:
-            logger.error("PDF processing failed")
-            return {}
-        
-        # Step 2: Build vector store
-        logger.info("Step 2/7: Building vector store...")
-        if not self.build_vector_store(processed_data):
-            logger.error("Vector store creation failed")
-            return {}
+        # Steps 1-2 are cached on disk, keyed by PDF content and embedder;
+        # the cache is best-effort and never fails the analysis
+        cache_key = self._pdf_cache_key(pdf_path)
+        self.document_id = cache_key
+        vs_path = processed_path = processed_data = None
+        if cache_key is not None:
+            vs_path = self.output_dir / f"{cache_key}_vectorstore"
+            processed_path = self.output_dir / f"{cache_key}_processed.pkl"
+            processed_data = self.load_cached_pdf(vs_path, processed_path)
+            self._report_legacy_vector_store()
         
-        # Step 3: Business analysis
-        logger.info("Step 3/7: Analyzing business...")
-        self.results['business'] = self.analyze_business()
-        
-        # Step 4: Financial analysis
-        logger.info("Step 4/7: Analyzing financials...")
-        self.results['financials'] = self.analyze_financials(processed_data)
-        
-        # Step 5: Risk analysis
-        logger.info("Step 5/7: Analyzing risks...")
-        self.results['risks'] = self.analyze_risks()
+        if processed_data is not None:
+            logger.info("Steps 1-2/7: Loaded cached PDF data and vector store")
+        else:
+            # Step 1: Process PDF
+            logger.info("Step 1/7: Processing PDF...")
+            processed_data = self.process_pdf(pdf_path)
+            if not processed_data:
+                logger.error("PDF processing failed")
+                return {}
+            
+            # Step 2: Build vector store
+            logger.info("Step 2/7: Building vector store...")
+            if not self.build_vector_store(processed_data, vs_path):
+                logger.error("Vector store creation failed")
+                return {}
+            
+            if processed_path is not None:
+                self.save_cached_pdf(processed_data, processed_path)
         
-        # Step 6: IPO details
-        logger.info("Step 6/7: Extracting IPO details...")
-        self.results['ipo_details'] = self.analyze_ipo_details()
+        # Steps 3-6 only depend on steps 1-2, so they run concurrently:
+        # the pandas financial math overlaps with the LLM-bound analyses
+        logger.info("Steps 3-6/7: Analyzing business, financials, risks and IPO details...")
+        self._run_analyses(processed_data)
         
         # Step 7: Generate recommendation
         logger.info("Step 7/7: Generating recommendation...")
@@ -104,6 +173,38 @@ class IPOAnalysisOrchestrator:
         logger.info("Analysis complete!")
         return self.results
     
+    def _run_analyses(self, processed_data: Dict):
+        """
+        Run steps 3-6 concurrently, each on a worker thread
+        
+        Results are stored and checkpointed on the calling thread as the
+        stages finish. Plain threads rather than asyncio.run(), so this
+        also works when the caller already runs an event loop.
+        """
+        stages = {
+            'business': (self.analyze_business,),
+            'financials': (self.analyze_financials, processed_data),
+            'risks': (self.analyze_risks,),
+            'ipo_details': (self.analyze_ipo_details,)
+        }
+        
+        with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+            futures = {
+                executor.submit(func, *args): key
+                for key, (func, *args) in stages.items()
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                self.results[key] = future.result()
+                logger.info(f"Finished {key} analysis")
+                
+                # A failed checkpoint must not cost the finished stages;
+                # only the final save can fail the run
+                try:
+                    self.save_results(partial=True)
+                except Exception as e:
+                    logger.warning(f"Could not save checkpoint after {key}: {e}")
+    
     def process_pdf(self, pdf_path: Path) -> Optional[Dict]:
         """
         Process PDF and extract data
@@ -120,7 +221,92 @@ class IPOAnalysisOrchestrator:
             logger.error(f"Error processing PDF: {e}")
             return None
     
-    def build_vector_store(self, processed_data: Dict) -> bool:
+    def _pdf_cache_key(self, pdf_path: Path) -> Optional[str]:
+        """
+        Cache key for a prospectus: PDF content hash plus embedder model
+        
+        Including the model name invalidates cached vectors when the
+        embedding model changes.
+        
+        Returns:
+            Key string, or None if the PDF cannot be read or the
+            embedding model is unknown
+        """
+        model_name = self._embedder_model_name()
+        if model_name is None:
+            logger.info("Embedder exposes no model name, not caching PDF data")
+            return None
+        
+        try:
+            digest = hashlib.sha256(Path(pdf_path).read_bytes())
+        except OSError as e:
+            logger.warning(f"Not caching {pdf_path}: {e}")
+            return None
+        
+        digest.update(model_name.encode())
+        return digest.hexdigest()[:16]
+    
+    def _embedder_model_name(self) -> Optional[str]:
+        """
+        Name of the embedding model, used in cache keys
+        
+        Returns:
+            Model name, or None if the embedder does not expose one; the
+            persistent caches are skipped then, as stale vectors from
+            another model could not be told apart
+        """
+        model_name = getattr(self.embedder, 'model_name', None)
+        return str(model_name) if model_name else None
+    
+    def _report_legacy_vector_store(self):
+        """
+        Point out a vector store left by the per-company layout
+        
+        Cached stores are named by content hash; a store saved as
+        <company>_vectorstore by earlier versions is no longer read or
+        updated when caching is on.
+        """
+        legacy_path = self.output_dir / f"{self.company_name}_vectorstore"
+        if legacy_path.exists():
+            logger.info(
+                f"{legacy_path} is from the old per-company layout and is no "
+                f"longer used; it can be deleted"
+            )
+    
+    def load_cached_pdf(self, vs_path: Path, processed_path: Path) -> Optional[Dict]:
+        """
+        Load processed PDF data and its vector store from a previous run
+        
+        Returns:
+            Processed data if both cache entries exist, else None
+        """
+        if not (vs_path.exists() and processed_path.exists()):
+            return None
+        
+        try:
+            with open(processed_path, 'rb') as f:
+                processed_data = pickle.load(f)
+            
+            self.vector_store.load(vs_path)
+            return processed_data
+            
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache {vs_path}: {e}")
+            return None
+    
+    def save_cached_pdf(self, processed_data: Dict, processed_path: Path):
+        """
+        Store processed PDF data for later runs; failures are only logged
+        """
+        try:
+            with open(processed_path, 'wb') as f:
+                pickle.dump(processed_data, f)
+        except Exception as e:
+            logger.warning(f"Could not cache processed PDF data: {e}")
+            processed_path.unlink(missing_ok=True)
+    
+    def build_vector_store(self, processed_data: Dict,
+                           vs_path: Optional[Path] = None) -> bool:
         """
         Build vector store from processed data
         """
@@ -137,14 +323,15 @@ class IPOAnalysisOrchestrator:
                 table_chunk = chunker.chunk_table(table)
                 chunks.append(table_chunk)
             
-            # Create embeddings
-            chunks = self.embedder.embed_chunks(chunks)
+            # Create embeddings (reusing cached vectors where possible)
+            chunks = self._embed_chunks_cached(chunks)
             
             # Build vector store
             self.vector_store.add_chunks(chunks)
             
             # Save vector store
-            vs_path = self.output_dir / f"{self.company_name}_vectorstore"
+            if vs_path is None:
+                vs_path = self.output_dir / f"{self.company_name}_vectorstore"
             self.vector_store.save(vs_path)
             
             logger.info(f"Vector store built with {len(chunks)} chunks")
@@ -154,6 +341,71 @@ class IPOAnalysisOrchestrator:
             logger.error(f"Error building vector store: {e}")
             return False
     
+    def _embed_chunks_cached(self, chunks: list) -> list:
+        """
+        Embed chunks, skipping texts already in the persistent cache
+        
+        The cache is keyed on the embedder's model name and checked against
+        its embedding_dim; without a model name, or if the cache cannot be
+        used, every chunk is embedded as usual.
+        """
+        model_name = self._embedder_model_name()
+        if model_name is None or not chunks:
+            return self.embedder.embed_chunks(chunks)
+        
+        from src.embeddings.embedding_cache import EmbeddingCache
+        
+        dim = self.embedder.embedding_dim
+        try:
+            cache = EmbeddingCache(model_name=model_name, dim=dim)
+        except Exception as e:
+            logger.warning(f"Embedding cache unavailable: {e}")
+            return self.embedder.embed_chunks(chunks)
+        
+        try:
+            return self._embed_with_cache(chunks, cache, dim)
+        finally:
+            cache.close()
+    
+    def _embed_with_cache(self, chunks: list, cache, dim: int) -> list:
+        """
+        Embed the cache misses and fill in the hits from an open EmbeddingCache
+        """
+        key = self.EMBEDDING_KEY
+        
+        try:
+            cached = cache.get_many([c['text'] for c in chunks])
+        except Exception as e:
+            logger.warning(f"Embedding cache lookup failed: {e}")
+            return self.embedder.embed_chunks(chunks)
+        
+        # Always embed at least one chunk: its output confirms where
+        # embed_chunks stores vectors before any hit is written there
+        miss_idx = [i for i, vector in enumerate(cached) if vector is None]
+        embed_idx = miss_idx or [0]
+        embedded = self.embedder.embed_chunks([chunks[i] for i in embed_idx])
+        
+        if not all(np.shape(c.get(key)) == (dim,) for c in embedded):
+            logger.warning(f"embed_chunks output has no '{key}' vectors, not caching")
+            return self.embedder.embed_chunks(chunks)
+        
+        for i, vector in enumerate(cached):
+            if vector is not None:
+                chunks[i][key] = vector
+        for i, chunk in zip(embed_idx, embedded):
+            chunks[i] = chunk
+        
+        try:
+            cache.put_many([c['text'] for c in embedded], [c[key] for c in embedded])
+        except Exception as e:
+            logger.warning(f"Could not update embedding cache: {e}")
+        
+        logger.info(
+            f"Embedding cache: {len(chunks) - len(miss_idx)} hits, "
+            f"{len(miss_idx)} misses"
+        )
+        return chunks
+    
     def analyze_business(self) -> Dict:
         """
         Run business analysis
@@ -208,8 +460,13 @@ class IPOAnalysisOrchestrator:
         """
         try:
             from src.analysis.risk_analyzer import RiskAnalyzer
+            from src.shared.singletons import get_search_cache
             
-            analyzer = RiskAnalyzer(self.vector_store, self.embedder, self.llm)
+            analyzer = RiskAnalyzer(
+                self.vector_store, self.embedder, self.llm,
+                search_cache=get_search_cache(),
+                document_id=self.document_id
+            )
             risk_analysis = analyzer.analyze_all_risks()
             
             # Calculate risk score
@@ -229,9 +486,11 @@ class IPOAnalysisOrchestrator:
         Extract IPO details
         """
         try:
+            from src.shared.singletons import cached_query_embedding
+            
             # Query for IPO details
             query = "What is the IPO size, fresh issue, offer for sale, and use of proceeds?"
-            query_emb = self.embedder.embed_single(query)
+            query_emb = cached_query_embedding(self.embedder, query)
             
             chunks = self.vector_store.search_by_section(
                 query_emb,
@@ -245,20 +504,7 @@ class IPOAnalysisOrchestrator:
             # Use LLM to extract details
             context = '\n\n'.join([c['text'] for c in chunks[:5]])
             
-            prompt = f"""Extract IPO details from this prospectus text:
-
-{context}
-
-Provide:
-1. Total issue size
-2. Fresh issue amount
-3. Offer for sale amount
-4. Use of proceeds (breakdown)
-5. Price band (if mentioned)
-
-Format clearly. State if information not available.
-
-IPO Details:"""
+            prompt = IPO_DETAILS_PROMPT.format(context=context)
             
             response = self.llm.generate(
                 prompt=prompt,
@@ -291,19 +537,53 @@ IPO Details:"""
             logger.error(f"Error generating recommendation: {e}")
             return {'error': str(e)}
     
-    def save_results(self):
+    def save_results(self, partial: bool = False):
         """
         Save analysis results to file
+        
+        Args:
+            partial: Checkpoint after an intermediate step, so a cancelled
+                run still leaves the completed sections on disk. Checkpoints
+                go to a separate file, which the final save removes.
         """
         output_file = self.output_dir / f"{self.company_name}_analysis.json"
+        checkpoint_file = self.output_dir / f"{self.company_name}_analysis.partial.json"
+        target = checkpoint_file if partial else output_file
         
-        # Prepare serializable results
-        serializable_results = self._make_serializable(self.results)
+        # Write then rename so a cancelled run never leaves a truncated file
+        tmp_file = target.with_suffix('.tmp')
         
-        with open(output_file, 'w') as f:
-            json.dump(serializable_results, f, indent=2)
+        if orjson is not None:
+            # orjson handles numpy and non-string keys natively; only
+            # objects like DataFrames go through the default hook
+            tmp_file.write_bytes(orjson.dumps(
+                self.results,
+                default=self._orjson_default,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            ))
+        else:
+            # Prepare serializable results
+            serializable_results = self._make_serializable(self.results)
+            
+            with open(tmp_file, 'w') as f:
+                json.dump(serializable_results, f, indent=2)
+        
+        tmp_file.replace(target)
         
-        logger.info(f"Results saved to {output_file}")
+        if partial:
+            logger.debug(f"Checkpoint saved to {checkpoint_file}")
+        else:
+            checkpoint_file.unlink(missing_ok=True)
+            logger.info(f"Results saved to {output_file}")
+    
+    @staticmethod
+    def _orjson_default(obj):
+        """
+        Fallback for types orjson cannot serialize itself
+        """
+        if hasattr(obj, 'to_dict'):
+            return obj.to_dict()
+        return str(obj)
     
     def _make_serializable(self, obj):
         """
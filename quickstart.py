@@ -4,8 +4,10 @@ Quick Start Script for IPO Intelligence Platform
 Run this to test the system with sample data
 """
 
+import os
 import sys
 import subprocess
+import importlib.util
 from pathlib import Path
 import time
 
@@ -33,12 +35,13 @@ def check_dependencies():
         'plotly'
     ]
     
+    # find_spec only locates the package; importing heavy modules like
+    # sentence_transformers here would cost seconds just to check presence
     missing = []
     for package in required:
-        try:
-            __import__(package.replace('-', '_'))
+        if importlib.util.find_spec(package.replace('-', '_')) is not None:
             print(f"  ✓ {package}")
-        except ImportError:
+        else:
             print(f"  ✗ {package} (missing)")
             missing.append(package)
     
@@ -50,23 +53,43 @@ def check_dependencies():
     print("\n✓ All dependencies installed")
     return True
 
+
+_http_session = None
+
+
+def get_http_session():
+    """Shared HTTP session so repeated Ollama probes reuse one connection"""
+    global _http_session
+    if _http_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        _http_session = requests.Session()
+        _http_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return _http_session
+
+
 def check_ollama():
     """Check if Ollama is running"""
     print("\n🤖 Checking Ollama...")
     
     try:
-        import requests
-        response = requests.get("http://localhost:11434/api/tags", timeout=2)
+        response = get_http_session().get("http://localhost:11434/api/tags", timeout=2)
         if response.status_code == 200:
             models = response.json().get('models', [])
             print(f"  ✓ Ollama is running")
             
-            # Check for mistral or llama
-            model_names = [m['name'] for m in models]
-            if any('mistral' in name for name in model_names):
+            # Check for mistral or llama in a single pass over the models
+            found = {
+                family
+                for m in models
+                for family in ('mistral', 'llama')
+                if family in m['name']
+            }
+            if 'mistral' in found:
                 print("  ✓ Mistral model found")
                 return True
-            elif any('llama' in name for name in model_names):
+            elif 'llama' in found:
                 print("  ✓ LLaMA model found")
                 return True
             else:
@@ -154,8 +177,8 @@ def run_tests():
     
     # Test embedder
     try:
-        from src.embeddings.embedder import Embedder
-        embedder = Embedder()
+        from src.shared.singletons import get_embedder
+        embedder = get_embedder()
         test_emb = embedder.embed_single("test text")
         print(f"  ✓ Embedder working (dim={len(test_emb)})")
     except Exception as e:
@@ -192,7 +215,13 @@ def start_streamlit():
     print("="*60 + "\n")
     
     try:
-        subprocess.run(['streamlit', 'run', 'main.py'])
+        if os.name == 'posix':
+            # Replace this process so its imports don't stay resident
+            # alongside Streamlit
+            sys.stdout.flush()
+            os.execvp('streamlit', ['streamlit', 'run', 'main.py'])
+        else:
+            subprocess.run(['streamlit', 'run', 'main.py'])
     except KeyboardInterrupt:
         print("\n\n👋 Shutting down...")
     except Exception as e:
@@ -3,23 +3,132 @@ Risk Analyzer
 Extracts and classifies risks from IPO prospectus using RAG + LLM
 """
 
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+from collections import Counter
+from itertools import islice
+import asyncio
+import json
 import logging
+import re
+import threading
 from pathlib import Path
 
-logging.basicConfig(level=logging.INFO)
+import numpy as np
+
+try:
+    import ahocorasick
+except ImportError:  # optional, plain substring scan is used instead
+    ahocorasick = None
+
 logger = logging.getLogger(__name__)
 
+# A risk line in the LLM response starts with a number or a dash bullet
+_LIST_ITEM_RE = re.compile(r'^\s*[\d-]')
+_LIST_PREFIX_RE = re.compile(r'^[\s\d.\-)]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# One summary line per key risk in generate_risk_summary
+_RISK_FMT = "- {title}: {description} [Category: {category}, Severity: {severity}]".format_map
+
+
+class ProximityCache:
+    """
+    Approximate cache of vector search results keyed by query embedding
+    
+    A lookup hits when a cached query with the same key (document,
+    section, top_k) lies within `tolerance` cosine distance of the new
+    query. Least recently used entries are evicted beyond `capacity`.
+    Safe to share between threads.
+    """
+    
+    def __init__(self, tolerance: float = 0.02, capacity: int = 128):
+        self.tolerance = tolerance
+        self.capacity = capacity
+        self._entries = []  # (key, unit embedding, result), oldest first
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+    
+    def lookup(self, query_emb, key: Tuple) -> Optional[List[Dict]]:
+        """
+        Return a cached result for a near-identical query, or None
+        """
+        query = self._normalize(query_emb)
+        
+        with self._lock:
+            for i, (entry_key, entry_emb, result) in enumerate(self._entries):
+                if entry_key == key and 1.0 - float(np.dot(query, entry_emb)) <= self.tolerance:
+                    # Move to the most recently used position
+                    self._entries.append(self._entries.pop(i))
+                    return result
+        
+        return None
+    
+    def store(self, query_emb, key: Tuple, result: List[Dict]):
+        """
+        Cache a search result
+        """
+        entry = (key, self._normalize(query_emb), result)
+        
+        with self._lock:
+            self._entries.append(entry)
+            if len(self._entries) > self.capacity:
+                self._entries.pop(0)
+
 
 class RiskAnalyzer:
     """
     Analyze and classify risks from prospectus
     """
     
-    def __init__(self, vector_store, embedder, llm_client):
+    # Risks per batched classification prompt; larger batches make the
+    # model more likely to break the JSON format
+    CLASSIFY_BATCH_SIZE = 20
+    
+    # Severity indicators used by the keyword heuristic
+    HIGH_SEVERITY_INDICATORS = (
+        'significant', 'material', 'substantial', 'major',
+        'critical', 'severe', 'adversely affect', 'inability',
+        'failure', 'default', 'litigation', 'regulatory action'
+    )
+    
+    MEDIUM_SEVERITY_INDICATORS = (
+        'may affect', 'could impact', 'potential', 'possible',
+        'risk of', 'uncertainty', 'dependent', 'reliant'
+    )
+    
+    def __init__(self, vector_store, embedder, llm_client,
+                 llm_classification: bool = False,
+                 search_cache: Optional[ProximityCache] = None,
+                 document_id: Optional[str] = None):
+        """
+        Initialize analyzer
+        
+        Args:
+            vector_store: VectorStore instance
+            embedder: Embedder instance
+            llm_client: OllamaClient instance (see LlmClient in
+                src.shared.singletons), ideally the shared get_llm() one
+            llm_classification: Classify and score risks with batched LLM
+                calls, falling back to keyword heuristics per risk
+            search_cache: Optional ProximityCache shared across analyzers
+                to skip repeated searches for the same document
+            document_id: Stable identity of the prospectus in vector_store
+                (e.g. its content hash); search_cache is only used with one
+        """
         self.vector_store = vector_store
         self.embedder = embedder
         self.llm = llm_client
+        self.llm_classification = llm_classification
+        self.search_cache = search_cache
+        self.document_id = document_id
+        
+        self._risk_query = "What are all the risk factors mentioned in the prospectus?"
+        self._risk_query_emb = None
         
         self.risk_categories = {
             'business_risk': ['business model', 'operations', 'product'],
@@ -31,24 +140,90 @@ class RiskAnalyzer:
             'promoter_risk': ['promoter', 'management', 'related party'],
             'customer_concentration_risk': ['customer concentration', 'major customers']
         }
+        
+        self._build_keyword_matcher()
+    
+    def _build_keyword_matcher(self):
+        """
+        Index every category keyword and severity indicator for one-pass scans
+        """
+        self._all_keywords = set(self.HIGH_SEVERITY_INDICATORS)
+        self._all_keywords.update(self.MEDIUM_SEVERITY_INDICATORS)
+        
+        # keyword -> indices of the categories listing it, so scoring a
+        # risk only touches the keywords it actually contains
+        self._category_names = tuple(self.risk_categories)
+        self._keyword_categories = {}
+        for idx, keywords in enumerate(self.risk_categories.values()):
+            self._all_keywords.update(keywords)
+            for keyword in keywords:
+                self._keyword_categories.setdefault(keyword, []).append(idx)
+        
+        self._automaton = None
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self._all_keywords:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+    
+    def _keyword_hits(self, text: str) -> set:
+        """
+        Return the set of known keywords occurring in text
+        
+        With pyahocorasick installed this is a single automaton pass over
+        the text instead of one substring search per keyword.
+        """
+        if self._automaton is not None:
+            return {keyword for _, keyword in self._automaton.iter(text)}
+        return {keyword for keyword in self._all_keywords if keyword in text}
+    
+    @property
+    def risk_query_emb(self):
+        """
+        Embedding of the fixed risk-factor query, computed on first use
+        """
+        if self._risk_query_emb is None:
+            from src.shared.singletons import cached_query_embedding
+            
+            self._risk_query_emb = cached_query_embedding(self.embedder, self._risk_query)
+        return self._risk_query_emb
     
     def analyze_all_risks(self) -> Dict:
         """
         Comprehensive risk analysis
         """
+        from src.shared.singletons import run_sync
+        
+        return run_sync(self.analyze_all_risks_async())
+    
+    async def analyze_all_risks_async(self) -> Dict:
+        """
+        Comprehensive risk analysis
+        
+        Blocking LLM and search calls run on worker threads, and batched
+        classification prompts are issued concurrently.
+        """
         logger.info("Analyzing all risk factors...")
         
         # Get all risks from risk section
-        risks = self.extract_risk_factors()
+        risks = await asyncio.to_thread(self.extract_risk_factors)
+        
+        # Pre-label risks in batched LLM calls; unlabeled risks fall back
+        # to the keyword heuristics below
+        if self.llm_classification:
+            await self._classify_and_score_batch(risks)
+        
+        # Lower-cased risk texts shared by classification and severity
+        texts = {}
         
         # Classify risks
-        classified_risks = self.classify_risks(risks)
+        classified_risks = self.classify_risks(risks, texts)
         
         # Assess severity
-        severity_analysis = self.assess_severity(classified_risks)
+        severity_analysis = self.assess_severity(classified_risks, texts)
         
         # Generate summary
-        summary = self.generate_risk_summary(severity_analysis)
+        summary = await asyncio.to_thread(self.generate_risk_summary, severity_analysis)
         
         return {
             'all_risks': risks,
@@ -65,19 +240,30 @@ class RiskAnalyzer:
         logger.info("Extracting risk factors...")
         
         # Query for risks
-        query = "What are all the risk factors mentioned in the prospectus?"
-        query_emb = self.embedder.embed_single(query)
-        
-        # Search in risk section
-        chunks = self.vector_store.search_by_section(
-            query_emb,
-            section_type='risks',
-            top_k=top_k
-        )
-        
-        if not chunks:
-            # Fallback to general search
-            chunks = self.vector_store.search(query_emb, top_k=top_k)
+        query_emb = self.risk_query_emb
+        
+        # Results are only reusable for the same document; object ids of
+        # vector stores are recycled, so they cannot identify it
+        search_cache = self.search_cache if self.document_id is not None else None
+        cache_key = (self.document_id, 'risks', top_k)
+        chunks = None
+        if search_cache is not None:
+            chunks = search_cache.lookup(query_emb, cache_key)
+        
+        if chunks is None:
+            # Search in risk section
+            chunks = self.vector_store.search_by_section(
+                query_emb,
+                section_type='risks',
+                top_k=top_k
+            )
+            
+            if not chunks:
+                # Fallback to general search
+                chunks = self.vector_store.search(query_emb, top_k=top_k)
+            
+            if search_cache is not None:
+                search_cache.store(query_emb, cache_key, chunks)
         
         # Extract individual risks using LLM
         risks = self._extract_individual_risks(chunks)
@@ -88,7 +274,7 @@ class RiskAnalyzer:
         """
         Use LLM to extract individual risk items from chunks
         """
-        context = '\n\n'.join([c['text'] for c in chunks[:10]])
+        context = self._build_context(chunks[:10])
         
         prompt = f"""From the following risk factors section of an IPO prospectus, extract individual risks.
 
@@ -115,78 +301,203 @@ Extracted Risks:"""
         
         return risks
     
+    @staticmethod
+    def _build_context(chunks: List[Dict], max_chars: int = 8000) -> str:
+        """
+        Pack chunk texts into a prompt context of at most max_chars
+        
+        Whitespace runs are collapsed, chunks contained in an already
+        packed chunk are dropped, and packing stops at the first chunk
+        that no longer fits, keeping the retrieval order. An oversized
+        first chunk is truncated.
+        """
+        kept = []
+        used = 0
+        
+        for chunk in chunks:
+            text = _WHITESPACE_RE.sub(' ', chunk['text']).strip()
+            if not text or any(text in other for other in kept):
+                continue
+            
+            if not kept and len(text) > max_chars:
+                # Never send an empty context for one oversized chunk
+                text = text[:max_chars]
+            
+            cost = len(text) + (2 if kept else 0)
+            if used + cost > max_chars:
+                break
+            
+            kept.append(text)
+            used += cost
+        
+        return '\n\n'.join(kept)
+    
     def _parse_risk_response(self, response: str) -> List[Dict]:
         """
         Parse LLM response into structured risk list
         """
         risks = []
-        lines = response.split('\n')
         
-        current_risk = None
-        for line in lines:
-            line = line.strip()
-            if not line:
+        for line in response.splitlines():
+            # Only numbered or bulleted items are risks
+            if not _LIST_ITEM_RE.match(line):
                 continue
             
-            # Check if it's a numbered item
-            if line[0].isdigit() or line.startswith('-'):
-                # Extract risk title and description
-                # Simple parsing - could be improved
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    title = parts[0].strip('0123456789.-) ')
-                    description = parts[1].strip()
-                else:
-                    title = line.strip('0123456789.-) ')
-                    description = ""
-                
-                risks.append({
-                    'title': title,
-                    'description': description,
-                    'category': None,  # Will be set in classification
-                    'severity': None   # Will be set in severity analysis
-                })
+            # Extract risk title and description
+            title, _, description = line.partition(':')
+            title = _LIST_PREFIX_RE.sub('', title, count=1).strip()
+            description = description.strip()
+            
+            risks.append({
+                'title': title,
+                'description': description,
+                'category': None,  # Will be set in classification
+                'severity': None   # Will be set in severity analysis
+            })
         
         return risks
     
-    def classify_risks(self, risks: List[Dict]) -> Dict[str, List[Dict]]:
+    async def _classify_and_score_batch(self, risks: List[Dict]):
+        """
+        Set category and severity on risks with one LLM call per batch
+        
+        The batch prompts are independent and are sent concurrently.
+        Risks the model returns no valid labels for are left untouched.
+        """
+        valid_categories = set(self.risk_categories) | {'other'}
+        valid_severities = {'High', 'Medium', 'Low'}
+        
+        batches = [
+            risks[start:start + self.CLASSIFY_BATCH_SIZE]
+            for start in range(0, len(risks), self.CLASSIFY_BATCH_SIZE)
+        ]
+        batch_labels = await asyncio.gather(*(
+            asyncio.to_thread(self._request_batch_labels, batch, valid_categories)
+            for batch in batches
+        ))
+        
+        for batch, labels in zip(batches, batch_labels):
+            for idx, risk in enumerate(batch):
+                label = labels.get(str(idx))
+                if not isinstance(label, dict):
+                    continue
+                if label.get('category') in valid_categories:
+                    risk['category'] = label['category']
+                if label.get('severity') in valid_severities:
+                    risk['severity'] = label['severity']
+    
+    def _request_batch_labels(self, batch: List[Dict], categories: set) -> Dict:
+        """
+        Ask the LLM for {index: {category, severity}} over a batch of risks
+        """
+        keyed_risks = json.dumps({
+            str(idx): f"{risk['title']}: {risk['description']}"
+            for idx, risk in enumerate(batch)
+        }, indent=1)
+        
+        prompt = f"""Classify each IPO risk below by category and severity.
+
+Categories: {', '.join(sorted(categories))}
+Severities: High, Medium, Low
+
+Risks:
+{keyed_risks}
+
+Respond with JSON only, mapping each risk key to an object like
+{{"category": "...", "severity": "..."}}.
+
+JSON:"""
+        
+        try:
+            response = self.llm.generate(
+                prompt=prompt,
+                system_prompt="You label IPO risks. Output valid JSON only, no commentary.",
+                temperature=0.0,
+                max_tokens=2048
+            )
+        except Exception as e:
+            logger.warning(f"Batched risk labeling failed, using heuristics: {e}")
+            return {}
+        
+        # Tolerate prose or code fences around the JSON object
+        start, end = response.find('{'), response.rfind('}')
+        try:
+            labels = json.loads(response[start:end + 1])
+        except ValueError:
+            logger.warning("Could not parse batched risk labels, using heuristics")
+            return {}
+        
+        return labels if isinstance(labels, dict) else {}
+    
+    @staticmethod
+    def _risk_text(risk: Dict, texts: Optional[Dict[int, str]] = None) -> str:
+        """
+        Lower-cased title + description of a risk
+        
+        texts caches the result by id(risk) for as long as the caller
+        holds the risks, so the risk dict itself is never modified.
+        """
+        if texts is None:
+            return f"{risk['title']} {risk['description']}".lower()
+        
+        text = texts.get(id(risk))
+        if text is None:
+            text = texts[id(risk)] = f"{risk['title']} {risk['description']}".lower()
+        return text
+    
+    def classify_risks(self, risks: List[Dict],
+                       texts: Optional[Dict[int, str]] = None) -> Dict[str, List[Dict]]:
         """
         Classify risks into categories
+        
+        Args:
+            risks: Risks to classify
+            texts: Optional id(risk) -> text cache shared with assess_severity
         """
         logger.info("Classifying risks...")
         
-        classified = {category: [] for category in self.risk_categories.keys()}
-        classified['other'] = []
+        # Label everything first, then group in a single pass
+        categories = [
+            risk.get('category') or self._classify_single_risk(risk, texts)
+            for risk in risks
+        ]
         
-        for risk in risks:
-            category = self._classify_single_risk(risk)
+        classified = {category: [] for category in (*self.risk_categories, 'other')}
+        for risk, category in zip(risks, categories):
             risk['category'] = category
             classified[category].append(risk)
         
         return classified
     
-    def _classify_single_risk(self, risk: Dict) -> str:
+    def _classify_single_risk(self, risk: Dict,
+                              texts: Optional[Dict[int, str]] = None) -> str:
         """
         Classify a single risk into category
         """
-        risk_text = (risk['title'] + ' ' + risk['description']).lower()
+        hits = self._keyword_hits(self._risk_text(risk, texts))
         
         # Score each category
-        category_scores = {}
-        for category, keywords in self.risk_categories.items():
-            score = sum(1 for keyword in keywords if keyword in risk_text)
-            if score > 0:
-                category_scores[category] = score
-        
-        # Return category with highest score
-        if category_scores:
-            return max(category_scores, key=category_scores.get)
+        category_scores = [0] * len(self._category_names)
+        for keyword in hits:
+            for idx in self._keyword_categories.get(keyword, ()):
+                category_scores[idx] += 1
+        
+        # Return category with highest score, earliest category on ties
+        best = max(range(len(category_scores)), key=category_scores.__getitem__,
+                   default=None)
+        if best is not None and category_scores[best] > 0:
+            return self._category_names[best]
         else:
             return 'other'
     
-    def assess_severity(self, classified_risks: Dict[str, List[Dict]]) -> Dict:
+    def assess_severity(self, classified_risks: Dict[str, List[Dict]],
+                        texts: Optional[Dict[int, str]] = None) -> Dict:
         """
         Assess severity of each risk
+        
+        Args:
+            classified_risks: Output of classify_risks
+            texts: Optional id(risk) -> text cache shared with classify_risks
         """
         logger.info("Assessing risk severity...")
         
@@ -198,14 +509,15 @@ Extracted Risks:"""
             
             # Assess each risk
             for risk in risks:
-                severity = self._assess_risk_severity(risk)
+                severity = risk.get('severity') or self._assess_risk_severity(risk, texts)
                 risk['severity'] = severity
             
             # Category-level summary
+            counts = Counter(r['severity'] for r in risks)
             severity_counts = {
-                'high': sum(1 for r in risks if r['severity'] == 'High'),
-                'medium': sum(1 for r in risks if r['severity'] == 'Medium'),
-                'low': sum(1 for r in risks if r['severity'] == 'Low')
+                'high': counts['High'],
+                'medium': counts['Medium'],
+                'low': counts['Low']
             }
             
             severity_analysis[category] = {
@@ -216,30 +528,18 @@ Extracted Risks:"""
         
         return severity_analysis
     
-    def _assess_risk_severity(self, risk: Dict) -> str:
+    def _assess_risk_severity(self, risk: Dict,
+                              texts: Optional[Dict[int, str]] = None) -> str:
         """
         Assess severity of a single risk
         
         Uses keyword-based heuristics
         """
-        text = (risk['title'] + ' ' + risk['description']).lower()
-        
-        # High severity indicators
-        high_indicators = [
-            'significant', 'material', 'substantial', 'major',
-            'critical', 'severe', 'adversely affect', 'inability',
-            'failure', 'default', 'litigation', 'regulatory action'
-        ]
-        
-        # Medium severity indicators
-        medium_indicators = [
-            'may affect', 'could impact', 'potential', 'possible',
-            'risk of', 'uncertainty', 'dependent', 'reliant'
-        ]
+        hits = self._keyword_hits(self._risk_text(risk, texts))
         
         # Count indicators
-        high_count = sum(1 for indicator in high_indicators if indicator in text)
-        medium_count = sum(1 for indicator in medium_indicators if indicator in text)
+        high_count = sum(1 for indicator in self.HIGH_SEVERITY_INDICATORS if indicator in hits)
+        medium_count = sum(1 for indicator in self.MEDIUM_SEVERITY_INDICATORS if indicator in hits)
         
         # Determine severity
         if high_count >= 2:
@@ -253,21 +553,20 @@ Extracted Risks:"""
         """
         Generate risk summary using LLM
         """
-        # Prepare summary of key risks
+        # Prepare summary of key risks: top 2 high-severity risks from each
+        # category, at most 10 overall (the prompt never uses more)
         key_risks = []
         for category, data in severity_analysis.items():
-            high_risks = [r for r in data['risks'] if r['severity'] == 'High']
-            if high_risks:
-                key_risks.extend(high_risks[:2])  # Top 2 from each category
+            high_risks = (r for r in data['risks'] if r['severity'] == 'High')
+            key_risks.extend(islice(high_risks, 2))
+            if len(key_risks) >= 10:
+                break
         
         if not key_risks:
             return "No major risks identified in prospectus."
         
         # Build context
-        risk_list = '\n'.join([
-            f"- {r['title']}: {r['description']} [Category: {r['category']}, Severity: {r['severity']}]"
-            for r in key_risks[:10]
-        ])
+        risk_list = '\n'.join(map(_RISK_FMT, key_risks[:10]))
         
         prompt = f"""Summarize the key risks for this IPO based on the following risk factors:
 
@@ -293,16 +592,19 @@ Summary:"""
         
         More high-severity risks = higher score (worse)
         """
-        total_risks = 0
-        weighted_sum = 0
-        
         weights = {'High': 3, 'Medium': 2, 'Low': 1}
         
-        for category, data in severity_analysis.items():
-            for risk in data['risks']:
-                severity = risk['severity']
-                weighted_sum += weights.get(severity, 1)
-                total_risks += 1
+        severity_counts = Counter(
+            risk['severity']
+            for data in severity_analysis.values()
+            for risk in data['risks']
+        )
+        
+        total_risks = sum(severity_counts.values())
+        weighted_sum = sum(
+            weights.get(severity, 1) * count
+            for severity, count in severity_counts.items()
+        )
         
         if total_risks == 0:
             return 0
@@ -319,6 +621,7 @@ Summary:"""
 
 def main():
     """Test risk analyzer"""
+    logging.basicConfig(level=logging.INFO)
     print("Risk Analyzer Module")
     print("Integrates with RAG pipeline for risk extraction and classification")
 
@@ -7,15 +7,92 @@ from typing import Dict, Optional
 import logging
 from pathlib import Path
 
-logging.basicConfig(level=logging.INFO)
+import numpy as np
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:  # optional, kernels run as plain Python
+    HAS_NUMBA = False
+    
+    def njit(*args, **kwargs):
+        return lambda func: func
+
 logger = logging.getLogger(__name__)
 
 
+def _last_value(series: Dict) -> float:
+    """
+    Latest value of a {year: value} series without copying its values
+    
+    Returns NaN for an empty series.
+    """
+    return next(reversed(series.values())) if series else np.nan
+
+
+# Numeric scoring kernels. Missing inputs are passed as NaN, which fails
+# every comparison, so no points are added for them. fastmath is left off
+# because it assumes NaN never occurs.
+
+@njit(cache=True)
+def _score_financials_kernel(revenue_cagr: float, latest_margin: float,
+                             latest_de: float) -> float:
+    score = 50.0  # Base score
+    
+    # Revenue growth
+    if revenue_cagr > 20:
+        score += 15
+    elif revenue_cagr > 10:
+        score += 10
+    elif revenue_cagr > 5:
+        score += 5
+    
+    # Margins
+    if latest_margin > 20:
+        score += 15
+    elif latest_margin > 10:
+        score += 10
+    elif latest_margin > 5:
+        score += 5
+    
+    # Debt levels
+    if latest_de < 0.5:
+        score += 10
+    elif latest_de < 1.0:
+        score += 5
+    elif latest_de > 2.0:
+        score -= 10
+    
+    return min(max(score, 0.0), 100.0)
+
+
+@njit(cache=True)
+def _weighted_sum_kernel(values: np.ndarray, weights: np.ndarray) -> float:
+    total = 0.0
+    for i in range(values.shape[0]):
+        total += values[i] * weights[i]
+    return total
+
+
 class RecommendationEngine:
     """
     Generate investment recommendations based on multi-factor analysis
     """
     
+    # (score key, threshold, message): a strength when score >= threshold
+    STRENGTH_RULES = (
+        ('financial_score', 75, "Strong financial performance and growth"),
+        ('business_score', 75, "Robust business model and market position"),
+        ('risk_score', 75, "Manageable risk profile"),
+    )
+    
+    # (score key, threshold, message): a concern when score < threshold
+    CONCERN_RULES = (
+        ('financial_score', 50, "Weak financial performance or declining trends"),
+        ('risk_score', 50, "Elevated risk factors"),
+        ('valuation_score', 40, "Potentially expensive valuation"),
+    )
+    
     def __init__(self, llm_client=None):
         self.llm = llm_client
         
@@ -27,6 +104,8 @@ class RecommendationEngine:
             'risk_score': 0.15,
             'valuation_score': 0.10
         }
+        self._weight_items = tuple(self.weights.items())
+        self._weight_vector = np.array([w for _, w in self._weight_items], dtype=np.float64)
         
         # Thresholds for recommendations
         self.thresholds = {
@@ -57,10 +136,12 @@ class RecommendationEngine:
         stance = self.determine_stance(overall_score)
         
         # Generate explanation
-        explanation = self.generate_explanation(scores, stance, analysis_results)
+        explanation = self.generate_explanation(
+            scores, stance, analysis_results, overall_score
+        )
         
         # Determine suitability
-        suitability = self.determine_suitability(scores, stance)
+        suitability = self.determine_suitability(scores, stance, overall_score)
         
         return {
             'scores': scores,
@@ -93,7 +174,7 @@ class RecommendationEngine:
         # Valuation score
         scores['valuation_score'] = self._score_valuation(analysis.get('valuation', {}))
         
-        logger.info(f"Component scores: {scores}")
+        logger.info("Component scores: %s", scores)
         return scores
     
     def _score_business(self, business_analysis: Dict) -> float:
@@ -120,45 +201,19 @@ class RecommendationEngine:
         - Cash flow
         - Balance sheet strength
         """
-        score = 50.0  # Base score
-        
         metrics = financial_data.get('basic_metrics', {})
         growth = financial_data.get('growth_metrics', {})
         ratios = financial_data.get('ratios', {})
         
-        # Revenue growth
-        revenue_cagr = growth.get('revenue_cagr_3y')
-        if revenue_cagr:
-            if revenue_cagr > 20:
-                score += 15
-            elif revenue_cagr > 10:
-                score += 10
-            elif revenue_cagr > 5:
-                score += 5
-        
-        # Margins
-        ebitda_margin = metrics.get('ebitda_margin', {})
-        if ebitda_margin:
-            latest_margin = list(ebitda_margin.values())[-1] if ebitda_margin else 0
-            if latest_margin > 20:
-                score += 15
-            elif latest_margin > 10:
-                score += 10
-            elif latest_margin > 5:
-                score += 5
-        
-        # Debt levels
-        de_ratio = ratios.get('debt_to_equity', {})
-        if de_ratio:
-            latest_de = list(de_ratio.values())[-1] if de_ratio else 0
-            if latest_de < 0.5:
-                score += 10
-            elif latest_de < 1.0:
-                score += 5
-            elif latest_de > 2.0:
-                score -= 10
-        
-        return min(max(score, 0), 100)
+        # Unpack inputs here; the kernel only sees floats (NaN = missing)
+        revenue_cagr = growth.get('revenue_cagr_3y') or np.nan
+        
+        latest_margin = _last_value(metrics.get('ebitda_margin', {}))
+        latest_de = _last_value(ratios.get('debt_to_equity', {}))
+        
+        return _score_financials_kernel(
+            float(revenue_cagr), float(latest_margin), float(latest_de)
+        )
     
     def _score_industry(self, industry_data: Dict) -> float:
         """
@@ -193,12 +248,21 @@ class RecommendationEngine:
         """
         Calculate weighted overall score
         """
-        overall = sum(
-            scores.get(component, 50) * weight
-            for component, weight in self.weights.items()
+        if not HAS_NUMBA:
+            # Packing five scores into an array costs more than it saves
+            # unless the kernel is compiled
+            overall = sum(
+                scores.get(component, 50) * weight
+                for component, weight in self._weight_items
+            )
+            return round(overall, 1)
+        
+        values = np.array(
+            [scores.get(component, 50) for component, _ in self._weight_items],
+            dtype=np.float64
         )
         
-        return round(overall, 1)
+        return round(_weighted_sum_kernel(values, self._weight_vector), 1)
     
     def determine_stance(self, overall_score: float) -> str:
         """
@@ -214,17 +278,23 @@ class RecommendationEngine:
             return 'Avoid'
     
     def generate_explanation(self, scores: Dict, stance: str, 
-                           analysis: Dict) -> str:
+                           analysis: Dict,
+                           overall_score: Optional[float] = None) -> str:
         """
         Generate explanation using LLM
+        
+        overall_score is recomputed from scores when not passed in.
         """
+        if overall_score is None:
+            overall_score = self.calculate_overall_score(scores)
+        
         if not self.llm:
-            return self._generate_template_explanation(scores, stance)
+            return self._generate_template_explanation(scores, stance, overall_score)
         
         # Build context
         context = f"""Investment Recommendation Analysis:
 
-Overall Score: {self.calculate_overall_score(scores)}/100
+Overall Score: {overall_score}/100
 Stance: {stance}
 
 Component Scores:
@@ -260,11 +330,13 @@ Explanation:"""
         
         return response.strip()
     
-    def _generate_template_explanation(self, scores: Dict, stance: str) -> str:
+    def _generate_template_explanation(self, scores: Dict, stance: str,
+                                       overall: Optional[float] = None) -> str:
         """
         Generate explanation without LLM (template-based)
         """
-        overall = self.calculate_overall_score(scores)
+        if overall is None:
+            overall = self.calculate_overall_score(scores)
         
         explanation = f"""Based on multi-factor analysis, this IPO scores {overall}/100, indicating a '{stance}' outlook.
 
@@ -303,11 +375,13 @@ Scoring Breakdown:
         
         return '; '.join(summary_parts) if summary_parts else "Analysis available"
     
-    def determine_suitability(self, scores: Dict, stance: str) -> str:
+    def determine_suitability(self, scores: Dict, stance: str,
+                              overall: Optional[float] = None) -> str:
         """
         Determine investor suitability
         """
-        overall = self.calculate_overall_score(scores)
+        if overall is None:
+            overall = self.calculate_overall_score(scores)
         risk_score = scores['risk_score']
         
         if overall >= 75 and risk_score >= 70:
@@ -323,19 +397,11 @@ Scoring Breakdown:
         """
         Extract key strengths from analysis
         """
-        strengths = []
-        
-        # Check financial strengths
-        if scores['financial_score'] >= 75:
-            strengths.append("Strong financial performance and growth")
-        
-        # Check business strengths
-        if scores['business_score'] >= 75:
-            strengths.append("Robust business model and market position")
-        
-        # Check risk profile
-        if scores['risk_score'] >= 75:
-            strengths.append("Manageable risk profile")
+        strengths = [
+            message
+            for key, threshold, message in self.STRENGTH_RULES
+            if scores[key] >= threshold
+        ]
         
         # Default if none
         if not strengths:
@@ -347,17 +413,12 @@ Scoring Breakdown:
         """
         Extract key concerns from analysis
         """
-        concerns = []
-        
         # Check for weak areas
-        if scores['financial_score'] < 50:
-            concerns.append("Weak financial performance or declining trends")
-        
-        if scores['risk_score'] < 50:
-            concerns.append("Elevated risk factors")
-        
-        if scores['valuation_score'] < 40:
-            concerns.append("Potentially expensive valuation")
+        concerns = [
+            message
+            for key, threshold, message in self.CONCERN_RULES
+            if scores[key] < threshold
+        ]
         
         # Get risks from analysis
         if 'risks' in analysis:
@@ -374,6 +435,7 @@ Scoring Breakdown:
 
 def main():
     """Test recommendation engine"""
+    logging.basicConfig(level=logging.INFO)
     
     # Sample analysis data
     sample_analysis = {
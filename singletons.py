@@ -0,0 +1,142 @@
+"""
+Shared Components
+Process-wide instances of the heavyweight pipeline components
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from typing import Dict, Optional, Protocol, Tuple
+import asyncio
+import logging
+import threading
+import weakref
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# embedder -> {query or tuple of queries: read-only embedding}; weak keys
+# so a cached embedding never keeps a discarded embedder alive
+_query_embeddings = weakref.WeakKeyDictionary()
+
+# The analysis stages run on concurrent threads but share one embedder,
+# which is not safe to call from several threads at once
+_embed_lock = threading.Lock()
+
+
+class LlmClient(Protocol):
+    """
+    Interface the analyzers expect from an LLM client
+    
+    Implementations should keep one long-lived HTTP session (e.g.
+    requests.Session or httpx.Client) and reuse it for every call, so the
+    several generate() calls per analysis do not each pay a new
+    connection handshake. get_llm() hands out a single instance, which
+    keeps that session alive for the whole process.
+    """
+    
+    def generate(self, prompt: str, system_prompt: Optional[str] = None,
+                 temperature: float = 0.1,
+                 max_tokens: Optional[int] = None) -> str:
+        ...
+
+
+@cache
+def get_embedder():
+    """
+    Shared Embedder instance
+    
+    Loading the sentence-transformers model takes seconds, so every
+    analysis in a long-running process (e.g. Streamlit) reuses one copy.
+    """
+    from src.embeddings.embedder import Embedder
+    
+    logger.info("Loading shared embedder...")
+    return Embedder()
+
+
+@cache
+def get_llm() -> LlmClient:
+    """
+    Shared OllamaClient instance
+    
+    Reusing one client keeps its HTTP connection pool warm across calls.
+    """
+    from src.llm.ollama_client import OllamaClient
+    
+    return OllamaClient()
+
+
+@cache
+def get_search_cache():
+    """
+    Shared ProximityCache of vector search results
+    
+    Entries are keyed by document, so re-analyzing a prospectus in the
+    same process skips its repeated searches.
+    """
+    from src.analysis.risk_analyzer import ProximityCache
+    
+    return ProximityCache()
+
+
+def _query_cache(embedder) -> Dict:
+    """
+    Query embedding cache of one embedder instance
+    """
+    cache = _query_embeddings.get(embedder)
+    if cache is None:
+        cache = _query_embeddings.setdefault(embedder, {})
+    return cache
+
+
+def cached_query_embedding(embedder, query: str) -> np.ndarray:
+    """
+    Embed a fixed query string once per embedder
+    
+    The analyzer queries are literals and the embedder is deterministic,
+    so repeated analyses (and later IPOs) reuse the first embedding. The
+    array is shared between callers and therefore read-only.
+    """
+    cache = _query_cache(embedder)
+    embedding = cache.get(query)
+    if embedding is None:
+        with _embed_lock:
+            embedding = np.array(embedder.embed_single(query))
+        embedding.setflags(write=False)
+        cache[query] = embedding
+    return embedding
+
+
+def cached_query_embeddings(embedder, queries: Tuple[str, ...]) -> np.ndarray:
+    """
+    Embed a fixed tuple of queries in one batched embedder call
+    
+    Returns:
+        Read-only array of shape (len(queries), embedding_dim)
+    """
+    cache = _query_cache(embedder)
+    embeddings = cache.get(queries)
+    if embeddings is None:
+        with _embed_lock:
+            embeddings = np.array(embedder.embed_texts(list(queries)))
+        embeddings.setflags(write=False)
+        cache[queries] = embeddings
+    return embeddings
+
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion from synchronous code
+    
+    asyncio.run() refuses to start inside a running event loop (Jupyter,
+    async servers), so there the coroutine gets its own loop on a worker
+    thread instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
@@ -3,22 +3,83 @@ Table Extractor Module
 Specialized extraction for financial tables from IPO prospectuses
 """
 
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import re
 import logging
 from pathlib import Path
 
+try:
+    import ahocorasick
+except ImportError:  # optional, plain substring scan is used instead
+    ahocorasick = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Thousands separators and spaces inside printed figures
+_NUMBER_NOISE_RE = re.compile(r'[,\s]')
+
+
+def _parse_figure(value) -> float:
+    """
+    Parse one table cell, reading "(1,234)" as -1234; NaN if not a number
+    """
+    if isinstance(value, str):
+        value = _NUMBER_NOISE_RE.sub('', value)
+        if value.startswith('(') and value.endswith(')'):
+            value = '-' + value[1:-1]
+    
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
 
 class TableExtractor:
     """
     Extract and process financial tables from prospectus
     """
     
-    def __init__(self):
+    # Statement types in priority order with their indicator keywords
+    STATEMENT_KEYWORDS = (
+        ('profit_loss', ('revenue', 'income statement', 'profit', 'expenditure')),
+        ('balance_sheet', ('balance sheet', 'assets', 'liabilities', 'equity')),
+        ('cash_flow', ('cash flow', 'operating activities', 'investing activities')),
+    )
+    
+    # Lowercase row-label fragments identifying each metric
+    METRIC_PATTERNS = {
+        'revenue': ('revenue', 'total revenue', 'net revenue', 'sales', 'total income'),
+        'ebitda': ('ebitda', 'earnings before interest'),
+        'ebit': ('ebit', 'operating profit'),
+        'pat': ('pat', 'profit after tax', 'net profit'),
+        'total_assets': ('total assets',),
+        'total_liabilities': ('total liabilities',),
+        'equity': ('equity', 'shareholders equity', 'total equity'),
+        'total_debt': ('total debt', 'borrowings'),
+        'cash': ('cash', 'cash and cash equivalents'),
+    }
+    
+    def __init__(self, schema_hints: Optional[Dict] = None):
+        """
+        Initialize extractor
+        
+        Args:
+            schema_hints: Optional layout of tables from a known PDF parser,
+                skipping the matching heuristics:
+                'year_cols' - positions of the year columns, instead of
+                    matching headers against year_pattern; a {position:
+                    year} dict also gives each column's year, for headers
+                    that name none (the columns are renamed to the years)
+                'statement_type_key' - table dict key holding the statement
+                    type, instead of keyword classification
+        """
+        self.schema_hints = schema_hints or {}
+        self._year_positions = self.schema_hints.get('year_cols')
+        self._statement_type_key = self.schema_hints.get('statement_type_key')
+        
         self.financial_keywords = [
             'revenue', 'income', 'sales', 'turnover',
             'ebitda', 'ebit', 'profit', 'loss', 'pat',
@@ -26,7 +87,36 @@ class TableExtractor:
             'cash flow', 'operating', 'investing', 'financing'
         ]
         
-        self.year_pattern = re.compile(r'\b(20\d{2}|FY\s*\d{2})\b')
+        # Groups: two-digit fiscal year ("FY23"), four-digit year ("2023")
+        self.year_pattern = re.compile(r'\b(?:FY\s*(\d{2})|(20\d{2}))\b')
+        
+        # One alternation per metric, matched against lowercased labels
+        self._metric_res = {
+            metric: re.compile('|'.join(map(re.escape, patterns)))
+            for metric, patterns in self.METRIC_PATTERNS.items()
+        }
+        
+        # label fragment -> metrics it identifies, for one-pass label scans
+        self._metric_automaton = None
+        if ahocorasick is not None:
+            fragment_metrics = {}
+            for metric, patterns in self.METRIC_PATTERNS.items():
+                for pattern in patterns:
+                    fragment_metrics.setdefault(pattern, []).append(metric)
+            
+            self._metric_automaton = ahocorasick.Automaton()
+            for pattern, metrics in fragment_metrics.items():
+                self._metric_automaton.add_word(pattern, tuple(metrics))
+            self._metric_automaton.make_automaton()
+        
+        # keyword -> priority of its statement type, for one-pass scans
+        self._statement_automaton = None
+        if ahocorasick is not None:
+            self._statement_automaton = ahocorasick.Automaton()
+            for priority, (_, keywords) in enumerate(self.STATEMENT_KEYWORDS):
+                for keyword in keywords:
+                    self._statement_automaton.add_word(keyword, priority)
+            self._statement_automaton.make_automaton()
     
     def extract_financial_statements(self, tables: List[Dict]) -> Dict:
         """
@@ -49,134 +139,317 @@ class TableExtractor:
                 continue
             
             df = table['data']
-            statement_type = self._identify_statement_type(df)
+            
+            # Tables already labelled by the parser skip the keyword heuristics
+            statement_type = None
+            if self._statement_type_key is not None:
+                statement_type = table.get(self._statement_type_key)
+            if statement_type not in statements:
+                statement_type = self._classify_table(df, statements)
             
             if statement_type and statements[statement_type] is None:
                 statements[statement_type] = self._process_financial_table(df)
+                
+                # Every slot filled; the remaining tables cannot change anything
+                if all(v is not None for v in statements.values()):
+                    break
         
         return statements
     
-    def _identify_statement_type(self, df: pd.DataFrame) -> Optional[str]:
+    def _classify_table(self, df: pd.DataFrame, statements: Dict) -> Optional[str]:
+        """
+        Statement type of a table, or None if it cannot fill an empty slot
+        """
+        # A header keyword already bounds the type from above: skip
+        # tables that could only fill slots that are taken
+        header_text = self._header_text(df)
+        header_priority = self._statement_priority(header_text)
+        if header_priority is not None and all(
+            statements[statement_type] is not None
+            for statement_type, _ in self.STATEMENT_KEYWORDS[:header_priority + 1]
+        ):
+            return None
+        
+        # Nothing outranks a P&L keyword, so the first column is only
+        # read when the header leaves the type open
+        if header_priority == 0:
+            return self.STATEMENT_KEYWORDS[0][0]
+        return self._identify_statement_type(df, header_text)
+    
+    def _identify_statement_type(self, df: pd.DataFrame,
+                                 header_text: Optional[str] = None) -> Optional[str]:
         """
         Identify type of financial statement
+        
+        Args:
+            df: Table DataFrame
+            header_text: Lowercased header text, if the caller has it already
         """
         # Check column headers and first column
-        header_text = ' '.join([str(col).lower() for col in df.columns])
-        first_col_text = ' '.join([str(val).lower() for val in df.iloc[:, 0].values])
+        if header_text is None:
+            header_text = self._header_text(df)
+        first_col_text = ' '.join(map(str, df.iloc[:, 0].values)).lower()
         
         combined_text = header_text + ' ' + first_col_text
         
-        # Profit & Loss indicators
-        if any(word in combined_text for word in ['revenue', 'income statement', 'profit', 'expenditure']):
-            return 'profit_loss'
-        
-        # Balance Sheet indicators
-        elif any(word in combined_text for word in ['balance sheet', 'assets', 'liabilities', 'equity']):
-            return 'balance_sheet'
+        priority = self._statement_priority(combined_text)
+        return None if priority is None else self.STATEMENT_KEYWORDS[priority][0]
+    
+    @staticmethod
+    def _header_text(df: pd.DataFrame) -> str:
+        """
+        Lowercased column headers joined into one string
+        """
+        return ' '.join(map(str, df.columns)).lower()
+    
+    def _statement_priority(self, text: str) -> Optional[int]:
+        """
+        Index into STATEMENT_KEYWORDS of the highest-priority type in text
+        """
+        # Single automaton pass; the highest-priority type seen wins
+        if self._statement_automaton is not None:
+            best = None
+            for _, priority in self._statement_automaton.iter(text):
+                if best is None or priority < best:
+                    best = priority
+                    if best == 0:
+                        break
+            return best
         
-        # Cash Flow indicators
-        elif any(word in combined_text for word in ['cash flow', 'operating activities', 'investing activities']):
-            return 'cash_flow'
+        # Profit & Loss, then Balance Sheet, then Cash Flow indicators
+        for priority, (_, keywords) in enumerate(self.STATEMENT_KEYWORDS):
+            if any(word in text for word in keywords):
+                return priority
         
         return None
     
-    def _process_financial_table(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _process_financial_table(self, df: pd.DataFrame, copy: bool = False) -> pd.DataFrame:
         """
         Clean and process financial table
-        """
-        # Make copy
-        df = df.copy()
         
-        # Identify year columns
-        year_cols = []
-        for col in df.columns[1:]:  # Skip first column (usually labels)
-            if self.year_pattern.search(str(col)):
-                year_cols.append(col)
+        Args:
+            df: Raw table DataFrame
+            copy: Deep-copy the data first. Not needed for correctness: the
+                steps below only replace whole columns of a shallow copy,
+                so the caller's DataFrame is never modified.
+        """
+        df = df.copy(deep=copy)
         
-        # Keep only year columns plus first column
-        if year_cols:
-            df = df[[df.columns[0]] + year_cols]
+        # Identify year columns (first column holds the labels)
+        if self._year_positions is not None:
+            positions = [pos for pos in self._year_positions if 0 < pos < df.shape[1]]
+            if positions:
+                df = df.iloc[:, [0] + positions]
+            
+            # Hinted years become the headers, so metric lookups find them
+            # without parsing the original ones
+            if positions and isinstance(self._year_positions, dict):
+                df.columns = [df.columns[0]] + [self._year_positions[pos] for pos in positions]
+        else:
+            # Keep only year columns plus first column
+            year_cols = list(self._year_map(df))
+            if year_cols:
+                df = df[[df.columns[0]] + year_cols]
         
-        # Convert numeric columns
-        for col in df.columns[1:]:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        # Convert numeric columns, by position so repeated headers work
+        for pos in range(1, df.shape[1]):
+            df.isetitem(pos, self._to_numeric(df.iloc[:, pos]))
         
         # Remove completely empty rows
-        df = df.dropna(how='all', subset=df.columns[1:])
+        values = df.iloc[:, 1:].to_numpy(dtype=float, na_value=np.nan)
+        df = df.iloc[~np.isnan(values).all(axis=1)]
+        
+        # Clean row labels; numeric label columns are left alone and
+        # non-string cells in mixed columns are kept as they are
+        labels = df.iloc[:, 0]
+        if not pd.api.types.is_numeric_dtype(labels):
+            labels = labels.map(lambda v: v.strip() if isinstance(v, str) else v)
         
-        # Clean row labels
-        df.iloc[:, 0] = df.iloc[:, 0].str.strip()
+        # Labels are searched once per metric; as a category each distinct
+        # label is matched only once
+        df[df.columns[0]] = labels.astype('category')
         
         return df
     
-    def extract_metric_timeseries(self, df: pd.DataFrame, metric_name: str) -> Dict:
+    @staticmethod
+    def _to_numeric(series: pd.Series) -> pd.Series:
+        """
+        Parse a column of figures as printed in a prospectus
+        """
+        if pd.api.types.is_numeric_dtype(series):
+            return series
+        
+        values = np.fromiter(map(_parse_figure, series), dtype=float, count=len(series))
+        return pd.Series(values, index=series.index, name=series.name)
+    
+    def extract_metric_timeseries(self, df: pd.DataFrame, metric_name: str,
+                                  year_map: Optional[Dict] = None) -> Dict:
         """
         Extract time series for specific metric
         
         Args:
             df: Financial statement DataFrame
             metric_name: Name of metric to extract
+            year_map: Optional {column: year} from _year_map(df)
             
         Returns:
             Dictionary of {year: value}
         """
+        return self._as_dict(self.extract_metric_arrays(df, metric_name, year_map))
+    
+    def extract_metric_arrays(self, df: pd.DataFrame, metric_name: str,
+                              year_map: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Extract time series for specific metric as arrays
+        
+        Same lookup as extract_metric_timeseries, for consumers that
+        compute over the whole series at once.
+        
+        Returns:
+            (years, values): int64 and float64 arrays in column order
+        """
         if df is None or df.empty:
-            return {}
-        
-        # Find row containing metric
-        metric_patterns = {
-            'revenue': ['revenue', 'total revenue', 'net revenue', 'sales', 'total income'],
-            'ebitda': ['ebitda', 'earnings before interest'],
-            'ebit': ['ebit', 'operating profit'],
-            'pat': ['pat', 'profit after tax', 'net profit'],
-            'total_assets': ['total assets'],
-            'total_liabilities': ['total liabilities'],
-            'equity': ['equity', 'shareholders equity', 'total equity'],
-            'total_debt': ['total debt', 'borrowings'],
-            'cash': ['cash', 'cash and cash equivalents']
+            return self._empty_series()
+        
+        soa = self._to_soa(df, year_map)
+        return self._extract_metrics_soa(soa, [metric_name])[metric_name]
+    
+    @staticmethod
+    def _empty_series() -> Tuple[np.ndarray, np.ndarray]:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    
+    @staticmethod
+    def _as_dict(series: Tuple[np.ndarray, np.ndarray]) -> Dict:
+        """
+        {year: value} dict of a (years, values) pair
+        """
+        years, values = series
+        return dict(zip(years.tolist(), values.tolist()))
+    
+    def _to_soa(self, df: pd.DataFrame, year_map: Optional[Dict] = None) -> Dict:
+        """
+        Column-oriented view of a statement for repeated metric lookups
+        
+        Returns:
+            Dictionary with 'labels' (lowercased distinct row labels),
+            'codes' (row -> index into labels, -1 if missing), 'years'
+            (int array, one per year column) and 'values' (rows x year
+            columns float array)
+        """
+        if year_map is None:
+            year_map = self._year_map(df)
+        
+        labels = df.iloc[:, 0]
+        if isinstance(labels.dtype, pd.CategoricalDtype):
+            codes, uniques = labels.cat.codes.to_numpy(), labels.cat.categories
+        else:
+            # A Series, not its .array: pandas 2.x deprecates factorizing
+            # extension arrays passed directly
+            codes, uniques = pd.factorize(labels)
+        
+        # Column by column: cheaper than a multi-column selection on the
+        # small tables found in prospectuses
+        values = np.empty((len(df), 0))
+        if year_map:
+            values = np.column_stack([
+                df[col].to_numpy(dtype=float, na_value=np.nan) for col in year_map
+            ])
+        
+        return {
+            'labels': [str(label).lower() for label in uniques],
+            'codes': codes,
+            'years': np.fromiter(year_map.values(), dtype=np.int64, count=len(year_map)),
+            'values': values
         }
+    
+    def _extract_metrics_soa(self, soa: Dict, metric_names: List[str]) -> Dict:
+        """
+        Extract (years, values) time series for several metrics from a _to_soa view
+        
+        The distinct labels are walked once, testing every metric's pattern.
+        """
+        matched = {name: [False] * len(soa['labels']) for name in metric_names}
+        
+        # The automaton finds every known metric in a label at once; the
+        # rest get one regex test per label
+        use_automaton = self._metric_automaton is not None
+        pending = [(name, self._metric_re(name)) for name in matched
+                   if not (use_automaton and name in self.METRIC_PATTERNS)]
+        
+        for pos, label in enumerate(soa['labels']):
+            if use_automaton:
+                for _, names in self._metric_automaton.iter(label):
+                    for name in names:
+                        if name in matched:
+                            matched[name][pos] = True
+            
+            for name, metric_re in pending:
+                if metric_re.search(label) is not None:
+                    matched[name][pos] = True
         
-        patterns = metric_patterns.get(metric_name, [metric_name])
+        return {name: self._first_row(soa, matched[name]) for name in metric_names}
+    
+    def _metric_re(self, metric_name: str) -> re.Pattern:
+        """
+        Compiled label pattern of a metric; unknown metrics match their name
+        """
+        metric_re = self._metric_res.get(metric_name)
+        if metric_re is None:
+            metric_re = re.compile(re.escape(metric_name))
+        return metric_re
+    
+    @classmethod
+    def _first_row(cls, soa: Dict, matched: List[bool]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (years, values) of the first matched row that has any year values
+        """
+        # Spread the label matches back to rows by code; missing labels
+        # have code -1, which picks the trailing False
+        hits = np.array(matched + [False])[soa['codes']]
         
-        # Search for metric in first column
-        for idx, row_label in enumerate(df.iloc[:, 0]):
-            row_label_lower = str(row_label).lower()
+        for idx in np.flatnonzero(hits):
+            row = soa['values'][idx]
+            present = ~np.isnan(row)
             
-            for pattern in patterns:
-                if pattern in row_label_lower:
-                    # Extract values from this row
-                    row = df.iloc[idx]
-                    
-                    timeseries = {}
-                    for col in df.columns[1:]:
-                        year = self._extract_year(col)
-                        if year and pd.notna(row[col]):
-                            timeseries[year] = float(row[col])
-                    
-                    if timeseries:
-                        return timeseries
-        
-        return {}
+            if present.any():
+                return soa['years'][present], row[present]
+        
+        return cls._empty_series()
+    
+    def _year_map(self, df: pd.DataFrame) -> Dict:
+        """
+        Map each value column that names a year to that year
+        """
+        year_map = {}
+        for col in df.columns[1:]:
+            year = self._extract_year(col)
+            if year:
+                year_map[col] = year
+        return year_map
     
     def _extract_year(self, column_name: str) -> Optional[int]:
         """
         Extract year from column name
         """
         match = self.year_pattern.search(str(column_name))
-        if match:
-            year_str = match.group(1)
-            
-            # Handle FY format
-            if 'FY' in year_str.upper():
-                year_digits = re.search(r'\d{2}', year_str)
-                if year_digits:
-                    year = int(year_digits.group())
-                    # Convert 2-digit to 4-digit (assuming 20XX)
-                    return 2000 + year
-            else:
-                return int(year_str)
+        if not match:
+            return None
         
-        return None
+        fy_digits, full_year = match.groups()
+        if fy_digits:
+            # Convert 2-digit to 4-digit (assuming 20XX)
+            return 2000 + int(fy_digits)
+        return int(full_year)
+    
+    def _extract_metrics(self, df: pd.DataFrame, metrics: List[str]) -> Dict:
+        """
+        Extract several metrics from one statement in a single label pass
+        """
+        if df.empty:
+            return {metric: {} for metric in metrics}
+        
+        extracted = self._extract_metrics_soa(self._to_soa(df), metrics)
+        return {metric: self._as_dict(series) for metric, series in extracted.items()}
     
     def build_financial_data_dict(self, statements: Dict) -> Dict:
         """
@@ -193,23 +466,19 @@ class TableExtractor:
         # Extract from P&L
         if statements['profit_loss'] is not None:
             pl_df = statements['profit_loss']
-            
             metrics = ['revenue', 'ebitda', 'ebit', 'pat']
-            for metric in metrics:
-                financial_data[metric] = self.extract_metric_timeseries(pl_df, metric)
+            
+            financial_data.update(self._extract_metrics(pl_df, metrics))
         
         # Extract from Balance Sheet
         if statements['balance_sheet'] is not None:
             bs_df = statements['balance_sheet']
-            
             metrics = ['total_assets', 'total_liabilities', 'equity', 'total_debt', 'cash']
-            for metric in metrics:
-                financial_data[metric] = self.extract_metric_timeseries(bs_df, metric)
+            
+            financial_data.update(self._extract_metrics(bs_df, metrics))
         
         # Extract from Cash Flow
         if statements['cash_flow'] is not None:
-            cf_df = statements['cash_flow']
-            
             # Cash flow metrics are more complex - would need specific extraction
             # For now, placeholder
             financial_data['operating_cash_flow'] = {}
@@ -3,52 +3,57 @@ Comprehensive Test Suite for IPO Intelligence Platform
 Tests each module independently and integration
 """
 
+import asyncio
 import pytest
 import sys
 from pathlib import Path
 import numpy as np
+import pandas as pd
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from src.embeddings.embedder import Embedder
+from src.embeddings.chunker import SemanticChunker
+from src.embeddings.vector_store import VectorStore
+from src.embeddings.embedding_cache import EmbeddingCache
+from src.processing.table_extractor import TableExtractor
+from src.analysis.financial_calculator import FinancialCalculator
+from src.analysis.risk_analyzer import RiskAnalyzer, ProximityCache
+from src.recommendation.scorer import RecommendationEngine
+
+
+@pytest.fixture(scope='module')
+def embedder():
+    """One Embedder per test module; loading the model takes seconds"""
+    return Embedder()
+
 
 class TestEmbeddings:
     """Test embedding functionality"""
     
-    def test_embedder_initialization(self):
+    def test_embedder_initialization(self, embedder):
         """Test embedder can be initialized"""
-        from src.embeddings.embedder import Embedder
-        
-        embedder = Embedder()
         assert embedder is not None
         assert embedder.embedding_dim == 384
     
-    def test_single_embedding(self):
+    def test_single_embedding(self, embedder):
         """Test single text embedding"""
-        from src.embeddings.embedder import Embedder
-        
-        embedder = Embedder()
         text = "This is a test sentence"
         embedding = embedder.embed_single(text)
         
         assert embedding.shape == (384,)
         assert isinstance(embedding, np.ndarray)
     
-    def test_batch_embedding(self):
+    def test_batch_embedding(self, embedder):
         """Test batch embedding"""
-        from src.embeddings.embedder import Embedder
-        
-        embedder = Embedder()
         texts = ["Text one", "Text two", "Text three"]
         embeddings = embedder.embed_texts(texts)
         
         assert embeddings.shape == (3, 384)
     
-    def test_similarity_computation(self):
+    def test_similarity_computation(self, embedder):
         """Test similarity calculation"""
-        from src.embeddings.embedder import Embedder
-        
-        embedder = Embedder()
         emb1 = embedder.embed_single("The cat sat on the mat")
         emb2 = embedder.embed_single("The cat is sitting on the mat")
         emb3 = embedder.embed_single("The dog ran in the park")
@@ -65,16 +70,12 @@ class TestChunking:
     
     def test_chunker_initialization(self):
         """Test chunker initialization"""
-        from src.embeddings.chunker import SemanticChunker
-        
         chunker = SemanticChunker(chunk_size=512, overlap_ratio=0.15)
         assert chunker.chunk_size == 512
         assert chunker.overlap_tokens == 76
     
     def test_basic_chunking(self):
         """Test basic text chunking"""
-        from src.embeddings.chunker import SemanticChunker
-        
         chunker = SemanticChunker(chunk_size=50, overlap_ratio=0.2)
         
         text = " ".join(["word"] * 200)  # 200 words
@@ -85,8 +86,6 @@ class TestChunking:
     
     def test_section_splitting(self):
         """Test section-aware chunking"""
-        from src.embeddings.chunker import SemanticChunker
-        
         chunker = SemanticChunker()
         
         text = """
@@ -111,17 +110,11 @@ class TestVectorStore:
     
     def test_vector_store_initialization(self):
         """Test vector store init"""
-        from src.embeddings.vector_store import VectorStore
-        
         vs = VectorStore()
         assert vs.index.ntotal == 0
     
-    def test_add_and_search(self):
+    def test_add_and_search(self, embedder):
         """Test adding and searching vectors"""
-        from src.embeddings.vector_store import VectorStore
-        from src.embeddings.embedder import Embedder
-        
-        embedder = Embedder()
         vs = VectorStore()
         
         # Create sample chunks
@@ -145,20 +138,128 @@ class TestVectorStore:
         assert all('similarity_score' in r for r in results)
 
 
+class TestEmbeddingCache:
+    """Test persistent embedding cache"""
+    
+    def test_round_trip(self, tmp_path):
+        """Test stored embeddings are returned for the same texts"""
+        cache = EmbeddingCache(tmp_path / 'cache.sqlite', model_name='m', dim=3)
+        vectors = [np.array([1, 2, 3], dtype=np.float32),
+                   np.array([4, 5, 6], dtype=np.float32)]
+        cache.put_many(['a', 'b'], vectors)
+        
+        found = cache.get_many(['b', 'a'])
+        cache.close()
+        
+        np.testing.assert_array_equal(found[0], vectors[1])
+        np.testing.assert_array_equal(found[1], vectors[0])
+    
+    def test_misses(self, tmp_path):
+        """Test unknown texts, other models and other dimensions miss"""
+        db_path = tmp_path / 'cache.sqlite'
+        cache = EmbeddingCache(db_path, model_name='m', dim=3)
+        cache.put_many(['a'], [np.ones(3)])
+        
+        assert cache.get_many(['a', 'b'])[1] is None
+        cache.close()
+        
+        other_model = EmbeddingCache(db_path, model_name='other', dim=3)
+        assert other_model.get_many(['a']) == [None]
+        other_model.close()
+        
+        other_dim = EmbeddingCache(db_path, model_name='m', dim=4)
+        assert other_dim.get_many(['a']) == [None]
+        other_dim.close()
+
+
+class TestTableExtractor:
+    """Test financial table extraction"""
+    
+    def test_printed_figures(self):
+        """Test thousands separators and accounting negatives are parsed"""
+        extractor = TableExtractor()
+        
+        df = pd.DataFrame({
+            'Particulars': ['Revenue', 'Profit after tax', 'Notes'],
+            'FY 2022': ['1,000', '(1,234)', 'n/a'],
+            'FY 2023': ['1 200', '56', '-']
+        })
+        tables = [{'type': 'financial', 'data': df}]
+        
+        pl = extractor.extract_financial_statements(tables)['profit_loss']
+        
+        assert pl is not None
+        assert pl['FY 2022'].tolist() == [1000.0, -1234.0]
+        assert pl['FY 2023'].tolist() == [1200.0, 56.0]
+        
+        # The caller's table is left as it was
+        assert df['FY 2022'].tolist() == ['1,000', '(1,234)', 'n/a']
+    
+    def test_metric_timeseries(self):
+        """Test metric lookup by row label and year column"""
+        extractor = TableExtractor()
+        
+        df = pd.DataFrame({
+            'Particulars': ['Total Revenue', 'EBITDA', 'Net Profit'],
+            'FY23': [1000, 200, 120],
+            'FY 2024': [1100, None, 130]
+        })
+        
+        assert extractor.extract_metric_timeseries(df, 'revenue') == {2023: 1000.0, 2024: 1100.0}
+        assert extractor.extract_metric_timeseries(df, 'ebitda') == {2023: 200.0}
+        assert extractor.extract_metric_timeseries(df, 'pat') == {2023: 120.0, 2024: 130.0}
+        assert extractor.extract_metric_timeseries(df, 'total_debt') == {}
+    
+    def test_schema_hints(self):
+        """Test hinted year columns are used even without years in the headers"""
+        df = pd.DataFrame({
+            'Particulars': ['Revenue', 'PAT'],
+            'Current': ['1,100', '130'],
+            'Previous': ['1,000', '120'],
+            'Note': ['4', '5']
+        })
+        tables = [{'type': 'financial', 'data': df}]
+        
+        extractor = TableExtractor(schema_hints={'year_cols': {1: 2024, 2: 2023}})
+        data = extractor.build_financial_data_dict(extractor.extract_financial_statements(tables))
+        
+        assert data['revenue'] == {2024: 1100.0, 2023: 1000.0}
+        assert data['pat'] == {2024: 130.0, 2023: 120.0}
+        
+        # Positions alone still take the years from the headers
+        df.columns = ['Particulars', 'FY 2024', 'FY 2023', 'Note 2022']
+        extractor = TableExtractor(schema_hints={'year_cols': [2]})
+        data = extractor.build_financial_data_dict(extractor.extract_financial_statements(tables))
+        
+        assert data['revenue'] == {2023: 1000.0}
+    
+    def test_financial_data_dict(self):
+        """Test metrics are read from their statement"""
+        extractor = TableExtractor()
+        
+        df = pd.DataFrame({
+            'Particulars': ['Revenue', 'PAT'],
+            'FY 2023': ['(5)', '2,500']
+        })
+        statements = extractor.extract_financial_statements([{'type': 'financial', 'data': df}])
+        data = extractor.build_financial_data_dict(statements)
+        
+        assert isinstance(data, dict)
+        assert data['revenue'] == {2023: -5.0}
+        assert data['pat'] == {2023: 2500.0}
+        assert data['current_assets'] == {}
+
+
 class TestFinancialCalculator:
     """Test financial calculations"""
     
     def test_calculator_initialization(self):
         """Test calculator init"""
-        from src.analysis.financial_calculator import FinancialCalculator
-        
         calc = FinancialCalculator()
         assert calc is not None
     
     def test_basic_metrics(self):
         """Test basic financial metrics"""
-        from src.analysis.financial_calculator import FinancialCalculator
-        
         calc = FinancialCalculator()
         
         data = {
@@ -174,8 +275,6 @@ class TestFinancialCalculator:
     
     def test_growth_calculation(self):
         """Test growth metrics calculation"""
-        from src.analysis.financial_calculator import FinancialCalculator
-        
         calc = FinancialCalculator()
         
         data = {
@@ -190,8 +289,6 @@ class TestFinancialCalculator:
     
     def test_ratios(self):
         """Test financial ratios"""
-        from src.analysis.financial_calculator import FinancialCalculator
-        
         calc = FinancialCalculator()
         
         data = {
@@ -212,8 +309,6 @@ class TestFinancialCalculator:
     
     def test_no_llm_usage(self):
         """Verify NO LLM is used in calculations"""
-        from src.analysis.financial_calculator import FinancialCalculator
-        
         # This test ensures the calculator module doesn't import LLM
         calc = FinancialCalculator()
         
@@ -222,13 +317,182 @@ class TestFinancialCalculator:
         assert not hasattr(calc, 'model')
 
 
+class _FixedStore:
+    """Vector store stand-in returning one chunk per search"""
+    
+    def __init__(self, text):
+        self.text = text
+        self.searches = 0
+    
+    def search_by_section(self, query_emb, section_type, top_k):
+        self.searches += 1
+        return [{'text': self.text}]
+
+
+class _ConstEmbedder:
+    """Embedder stand-in returning the same unit vector for every text"""
+    
+    def embed_single(self, text):
+        return np.eye(8, dtype=np.float32)[0]
+
+
+class _EchoLLM:
+    """LLM stand-in listing the prompt context back as a single risk"""
+    
+    def generate(self, prompt, **kwargs):
+        context = prompt.split('Risk Factors Text:\n')[1].split('\n')[0]
+        return f"1. {context}: description"
+
+
+class TestRiskSearchCache:
+    """Test cached risk searches stay with their document"""
+    
+    def test_cache_keyed_by_document(self):
+        """Test a shared cache never serves another document's chunks"""
+        cache = ProximityCache()
+        embedder = _ConstEmbedder()
+        llm = _EchoLLM()
+        
+        def extract(store, document_id):
+            analyzer = RiskAnalyzer(store, embedder, llm, search_cache=cache,
+                                    document_id=document_id)
+            return analyzer.extract_risk_factors()
+        
+        first = _FixedStore('doc1 risk')
+        assert extract(first, 'doc1')[0]['title'] == 'doc1 risk'
+        
+        # Same document in a new store: served from the cache
+        again = _FixedStore('doc1 risk')
+        assert extract(again, 'doc1')[0]['title'] == 'doc1 risk'
+        assert again.searches == 0
+        
+        # Another document is always searched
+        other = _FixedStore('doc3 risk')
+        assert extract(other, 'doc3')[0]['title'] == 'doc3 risk'
+        assert other.searches == 1
+    
+    def test_no_cache_without_document_id(self):
+        """Test searches bypass the cache when the document is unknown"""
+        cache = ProximityCache()
+        
+        for text in ('doc1 risk', 'doc2 risk'):
+            store = _FixedStore(text)
+            analyzer = RiskAnalyzer(store, _ConstEmbedder(), _EchoLLM(), search_cache=cache)
+            
+            assert analyzer.extract_risk_factors()[0]['title'] == text
+            assert store.searches == 1
+
+
+class _ScriptedLLM:
+    """LLM stand-in returning a fixed reply, or raising it if an exception"""
+    
+    def __init__(self, reply):
+        self.reply = reply
+    
+    def generate(self, prompt, **kwargs):
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return self.reply
+
+
+class TestRiskLabeling:
+    """Test batched LLM risk labels and their heuristic fallback"""
+    
+    @staticmethod
+    def _label(reply):
+        risks = [
+            {'title': 'Litigation', 'description': 'a pending lawsuit may affect results',
+             'category': None, 'severity': None},
+            {'title': 'Competition', 'description': 'pricing pressure from rivals',
+             'category': None, 'severity': None},
+        ]
+        analyzer = RiskAnalyzer(None, None, _ScriptedLLM(reply), llm_classification=True)
+        asyncio.run(analyzer._classify_and_score_batch(risks))
+        analyzer.assess_severity(analyzer.classify_risks(risks))
+        return [(risk['category'], risk['severity']) for risk in risks]
+    
+    def test_json_reply(self):
+        """Test labels are read from JSON wrapped in prose and code fences"""
+        reply = ('Here are the labels:\n```json\n'
+                 '{"0": {"category": "market_risk", "severity": "High"},'
+                 ' "1": {"category": "other", "severity": "Low"}}\n```')
+        
+        assert self._label(reply) == [('market_risk', 'High'), ('other', 'Low')]
+    
+    def test_unknown_labels_ignored(self):
+        """Test categories and severities outside the allowed sets fall back"""
+        reply = ('{"0": {"category": "weather_risk", "severity": "Extreme"},'
+                 ' "1": {"category": "legal_risk", "severity": "Severe"}}')
+        
+        assert self._label(reply) == [('legal_risk', 'Medium'), ('legal_risk', 'Low')]
+    
+    def test_partial_reply(self):
+        """Test risks missing from the reply keep the heuristic labels"""
+        reply = '{"0": {"category": "market_risk"}}'
+        
+        assert self._label(reply) == [('market_risk', 'Medium'), ('market_risk', 'Low')]
+    
+    def test_malformed_reply(self):
+        """Test unparseable replies fall back to the heuristics"""
+        heuristic = [('legal_risk', 'Medium'), ('market_risk', 'Low')]
+        
+        assert self._label('{"0": {"category": "market_risk"') == heuristic
+        assert self._label('I cannot label these risks.') == heuristic
+        assert self._label('["market_risk", "High"]') == heuristic
+    
+    def test_client_error(self):
+        """Test a failing LLM client falls back to the heuristics"""
+        reply = ConnectionError('Ollama not running')
+        
+        assert self._label(reply) == [('legal_risk', 'Medium'), ('market_risk', 'Low')]
+
+
+class TestRiskContext:
+    """Test packing retrieved chunks into the risk prompt context"""
+    
+    def test_duplicates_dropped(self):
+        """Test repeated and contained chunks are packed once"""
+        chunks = [
+            {'text': 'Debt  levels\nare high.'},
+            {'text': 'Debt levels are high.'},
+            {'text': 'levels are'},
+            {'text': '   '},
+            {'text': 'Customers are concentrated.'},
+        ]
+        
+        context = RiskAnalyzer._build_context(chunks)
+        
+        assert context == 'Debt levels are high.\n\nCustomers are concentrated.'
+    
+    def test_order_preserved(self):
+        """Test chunks keep their retrieval order"""
+        chunks = [{'text': text} for text in ('third', 'first', 'second')]
+        
+        assert RiskAnalyzer._build_context(chunks) == 'third\n\nfirst\n\nsecond'
+    
+    def test_max_chars_cut_off(self):
+        """Test packing stops at the first chunk that does not fit"""
+        chunks = [{'text': 'a' * 40}, {'text': 'b' * 40}, {'text': 'c' * 10}, {'text': 'd'}]
+        
+        # 'd' would still fit after 'c' is skipped, but packing has stopped
+        context = RiskAnalyzer._build_context(chunks, max_chars=90)
+        
+        assert context == 'a' * 40 + '\n\n' + 'b' * 40
+        assert len(RiskAnalyzer._build_context(chunks, max_chars=82)) == 82
+        assert RiskAnalyzer._build_context(chunks, max_chars=81) == 'a' * 40
+    
+    def test_oversized_first_chunk(self):
+        """Test a first chunk longer than max_chars is truncated, not dropped"""
+        chunks = [{'text': 'x' * 100}, {'text': 'y'}]
+        
+        assert RiskAnalyzer._build_context(chunks, max_chars=10) == 'x' * 10
+
+
 class TestRecommendationEngine:
     """Test recommendation engine"""
     
     def test_scoring(self):
         """Test multi-factor scoring"""
-        from src.recommendation.scorer import RecommendationEngine
-        
         engine = RecommendationEngine()
         
         analysis = {
@@ -248,8 +512,6 @@ class TestRecommendationEngine:
     
     def test_stance_determination(self):
         """Test investment stance logic"""
-        from src.recommendation.scorer import RecommendationEngine
-        
         engine = RecommendationEngine()
         
         assert engine.determine_stance(80) == 'Conservative - Positive'
@@ -261,12 +523,8 @@ class TestRecommendationEngine:
 class TestIntegration:
     """Integration tests"""
     
-    def test_end_to_end_chunk_search(self):
+    def test_end_to_end_chunk_search(self, embedder):
         """Test complete chunking -> embedding -> search pipeline"""
-        from src.embeddings.chunker import SemanticChunker
-        from src.embeddings.embedder import Embedder
-        from src.embeddings.vector_store import VectorStore
-        
         # Sample text
         text = """
         Risk Factors: Customer concentration is a major risk.
@@ -279,7 +537,6 @@ class TestIntegration:
         chunks = chunker.chunk_document(text, extract_sections=True)
         
         # Embed
-        embedder = Embedder()
         chunks = embedder.embed_chunks(chunks)
         
         # Store